@@ -35,34 +35,27 @@ app.config['MYSQL_PASSWORD'] = 'password'
 app.config['MYSQL_DB'] = 'examproctordb'
 mysql = MySQL(app)
 
-executor = ThreadPoolExecutor(max_workers=8)  # Increased to 8 to include camera producer thread
-
-#Function to show face detection's Rectangle in Face Input Page
-def capture_by_frames():
-    global camera
-    utils.cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-    while True:
-        success, frame = utils.cap.read()  # read the camera frame
-        if not success or frame is None or frame.size == 0:
-            continue  # Just skip bad frames, don't yield blank
-        detector=cv2.CascadeClassifier('Haarcascades/haarcascade_frontalface_default.xml')
-        faces=detector.detectMultiScale(frame,1.2,6)
-         #Draw the rectangle around each face
-        for (x, y, w, h) in faces:
-            cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 3)
-        ret, buffer = cv2.imencode('.jpg', frame)
-        frame = buffer.tobytes()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+executor = ThreadPoolExecutor(max_workers=9)  # Camera producer, session recording and the detection threads
+PAGE_SIZE = 50  # Rows per page of the admin listings
+MAX_PAGE_SIZE = 200
 
+#Function to give the result id of the current student's exam, allocated once per exam
+def exam_result_id():
+    if 'ResultId' not in session:
+        session['ResultId'] = utils.allocate_resultId()
+    return session['ResultId']
 
 def start_cheat_detection():
     print("Starting cheat detection...")
     print(f"Current thread: {threading.current_thread().name}")
     print("Active threads:", threading.enumerate())
     print("Thread count:", threading.active_count())
+    # Models are normally loaded by the warm-up started on the system check page, this waits for it
+    utils.warm_up()
     # Launch camera producer thread first
     camera_task = executor.submit(utils.camera_producer_thread)
+    # The camera is encoded once for the whole exam, violation clips are cut from it
+    recording_task = executor.submit(utils.session_recording_thread)
     # Launch each detection system in its own thread
     task1 = executor.submit(utils.electronic_device_detection_thread)
     task2 = executor.submit(utils.cheat_Detection1)
@@ -117,18 +110,18 @@ def rules():
 def faceInput():
     return render_template('ExamFaceInput.html')
 
+#Function to show face detection's Rectangle in Face Input Page (one shared capture for every viewer)
 @app.route('/video_capture')
 def video_capture():
-    return Response(capture_by_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    return Response(utils.preview.stream(), mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @app.route('/saveFaceInput')
 def saveFaceInput():
     global profileName
-    if utils.cap.isOpened():
-        utils.cap.release()
+    utils.preview.stop()  # Free the camera for the profile picture
     cam = cv2.VideoCapture(0)
     success, frame = cam.read()  # read the camera frame
-    profileName=f"{studentInfo['Name']}_{utils.get_resultId():03}" + "Profile.jpg"
+    profileName=f"{studentInfo['Name']}_{exam_result_id():03}" + "Profile.jpg"
     cv2.imwrite(profileName,frame)
     utils.move_file_to_output_folder(profileName,'Profiles')
     cam.release()
@@ -137,11 +130,14 @@ def saveFaceInput():
 @app.route('/confirmFaceInput')
 def confirmFaceInput():
     profile = profileName
-    utils.fr.encode_faces()
+    # Only the new profile is encoded, the others come from the encoding cache
+    utils.fr.add_profile(profile)
     return render_template('ExamConfirmFaceInput.html', profile = profile)
 
 @app.route('/systemCheck')
 def systemCheck():
+    # Load the detection models in the background while the student runs the system check
+    executor.submit(utils.warm_up)
     return render_template('ExamSystemCheck.html')
 
 @app.route('/systemCheck', methods=["POST"])
@@ -158,6 +154,7 @@ def systemCheckError():
 
 @app.route('/exam')
 def exam():
+    utils.preview.stop()
     utils.cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
     keyboard.hook(utils.shortcut_handler)
     return render_template('Exam.html')
@@ -167,6 +164,7 @@ def examAction():
     link = ''
     if request.method == 'POST':
         examData = request.json
+        resultId = exam_result_id()
         if(examData['input']!=''):
             utils.Globalflag= False
             utils.cap.release()
@@ -182,10 +180,15 @@ def examAction():
                 "Duration": '',
                 "Mark": (1.5 * len(utils.shorcuts)),
                 "Link": '',
-                "RId": utils.get_resultId()
+                "RId": resultId
             })
             utils.shorcuts=[]
-            trustScore= utils.get_TrustScore(utils.get_resultId())
+            # The detector threads may still be stopping, close their open episodes under this exam
+            utils.close_episodes()
+            # Violation clips are logged by the background finalizer, let it catch up first
+            utils.violation_finalizer.wait_idle()
+            utils.session_recorder.remove_segments()
+            trustScore= utils.get_TrustScore(resultId)
             totalMark=  math.floor(float(examData['input'])* 6.6667)
             if trustScore >=30:
                 status="Fail(Cheating)"
@@ -198,7 +201,7 @@ def examAction():
                     status="Pass"
                     link = 'showResultPass'
             utils.write_json({
-                "Id": utils.get_resultId(),
+                "Id": resultId,
                 "Name": studentInfo['Name'],
                 "TotalMark": totalMark,
                 "TrustScore": max(100-trustScore, 0),
@@ -207,8 +210,13 @@ def examAction():
                 "StId": studentInfo['Id'],
                 "Link" : profileName
             },"result.json")
+            utils.sync_json_logs()
+            # The next exam gets a new result id
+            utils.current_result_id = None
+            session.pop('ResultId', None)
             resultStatus= studentInfo['Name']+';'+str(totalMark)+';'+status+';'+time.strftime("%Y-%m-%d", time.localtime(time.time()))
         else:
+            utils.current_result_id = resultId  # Detector threads log violations under this id
             utils.Globalflag = True
             start_cheat_detection()
             print(f"Global flag = {utils.Globalflag}")
@@ -227,8 +235,23 @@ def showResultFail(result_status):
 #Admin Related
 @app.route('/adminResults')
 def adminResults():
-    results = utils.getResults()
-    return render_template('Results.html', results=results)
+    # Rows are loaded page by page from /api/results
+    return render_template('Results.html')
+
+@app.route('/api/results')
+def apiResults():
+    limit = min(request.args.get('limit', PAGE_SIZE, type=int), MAX_PAGE_SIZE)
+    results, next_cursor = utils.queryResults(
+        after=request.args.get('after', ''),
+        limit=max(limit, 1),
+        search=request.args.get('q', ''),
+        status=request.args.get('status', ''),
+        date_from=request.args.get('date_from', ''),
+        date_to=request.args.get('date_to', ''),
+        min_trust=request.args.get('min_trust', type=float),
+        max_trust=request.args.get('max_trust', type=float),
+        descending=request.args.get('order', 'desc') != 'asc')
+    return jsonify({"results": results, "next": next_cursor})
 
 @app.route('/adminResultDetails/<resultId>')
 def adminResultDetails(resultId):
@@ -241,12 +264,43 @@ def adminResultDetailsVideo(videoInfo):
 
 @app.route('/adminStudents')
 def adminStudents():
+    # Rows are loaded page by page from /api/students
+    return render_template('Students.html')
+
+@app.route('/api/students')
+def apiStudents():
+    limit = max(min(request.args.get('limit', PAGE_SIZE, type=int), MAX_PAGE_SIZE), 1)
+    sort_by_name = request.args.get('sort') == 'name'
+    descending = request.args.get('order') == 'desc'
+    direction = 'DESC' if descending else 'ASC'
+    compare = '<' if descending else '>'
+    conditions = ["Role='STUDENT'"]
+    params = []
+    search = request.args.get('q', '').strip()
+    if search:
+        # Prefix search so the Name/Email indexes can be used
+        conditions.append("(Name LIKE %s OR Email LIKE %s)")
+        params += [search + '%', search + '%']
+    # Keyset pagination: continue after the last row of the previous page instead of OFFSET
+    after_id = request.args.get('after_id', type=int)
+    if after_id is not None:
+        if sort_by_name:
+            conditions.append(f"(Name, ID) {compare} (%s, %s)")
+            params += [request.args.get('after_name', ''), after_id]
+        else:
+            conditions.append(f"ID {compare} %s")
+            params.append(after_id)
+    order = f"Name {direction}, ID {direction}" if sort_by_name else f"ID {direction}"
     cur = mysql.connection.cursor()
     # Select all fields except password for security reasons
-    cur.execute("SELECT ID, Name, Email, Role, Created_at, Updated_at FROM students where Role='STUDENT'")
+    cur.execute(f"SELECT ID, Name, Email, Role, Created_at, Updated_at FROM students WHERE {' AND '.join(conditions)} "
+                f"ORDER BY {order} LIMIT %s", (*params, limit))
     data = cur.fetchall()
     cur.close()
-    return render_template('Students.html', students=data)
+    students = [{"Id": row[0], "Name": row[1], "Email": row[2], "Role": row[3],
+                 "Created_at": str(row[4]), "Updated_at": str(row[5])} for row in data]
+    next_cursor = {"after_id": data[-1][0], "after_name": data[-1][1]} if len(data) == limit else None
+    return jsonify({"students": students, "next": next_cursor})
 
 @app.route('/insertStudent', methods=['POST'])
 def insertStudent():
@@ -298,6 +352,12 @@ def updateStudent():
         mysql.connection.commit()
         return redirect(url_for('adminStudents'))
 
+#Monitoring Related
+@app.route('/metrics')
+def metrics():
+    """Detector schedule (target/effective rates, motion) and frame delivery counters"""
+    return jsonify(utils.get_metrics())
+
 #Debug Routes for Testing
 @app.route('/test-audio')
 def testAudio():
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Audio RMS Micro-Benchmark
+Compares the old struct.unpack + Python loop RMS with the vectorized NumPy
+Recorder.rms on one audio chunk (CHUNK samples of 16-bit audio).
+"""
+
+import math
+import os
+import struct
+import sys
+import timeit
+import numpy as np
+
+# Add the current directory to the path so we can import utils
+sys.path.append(os.path.dirname(__file__))
+
+import utils
+
+def legacy_rms(frame):
+    """Recorder.rms before vectorization"""
+    count = len(frame) / utils.SHORT_WIDTH
+    format = "%dh" % (count)
+    shorts = struct.unpack(format, frame)
+
+    sum_squares = 0.0
+    for sample in shorts:
+        n = sample * utils.SHORT_NORMALIZE
+        sum_squares += n * n
+    rms = math.pow(sum_squares / count, 0.5)
+
+    return rms * 1000
+
+def main():
+    rng = np.random.default_rng(0)
+    chunk = rng.integers(-3000, 3000, utils.CHUNK, dtype=np.int16).tobytes()
+    runs = 200
+
+    old_value = legacy_rms(chunk)
+    new_value = utils.Recorder.rms(chunk)
+    print("=== Audio RMS Benchmark ===")
+    print(f"Chunk: {utils.CHUNK} samples | legacy={old_value:.4f} | numpy={new_value:.4f} | "
+          f"match={math.isclose(old_value, new_value, rel_tol=1e-9)}")
+
+    old_time = timeit.timeit(lambda: legacy_rms(chunk), number=runs) / runs * 1e6
+    new_time = timeit.timeit(lambda: utils.Recorder.rms(chunk), number=runs) / runs * 1e6
+    print(f"legacy struct loop: {old_time:9.1f} us/chunk")
+    print(f"numpy frombuffer:   {new_time:9.1f} us/chunk")
+    print(f"speedup:            {old_time / new_time:9.1f}x")
+    # The old record loop also computed the RMS a second time inside inSound
+    print(f"per chunk in record(): {2 * old_time:.1f} us -> {new_time:.1f} us")
+
+if __name__ == "__main__":
+    main()
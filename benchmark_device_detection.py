@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Electronic Device Detection Backend Benchmark
+Compares latency and detection decisions of the ONNX Runtime / OpenVINO backends
+against the current PyTorch model on recorded frames.
+
+Usage:
+    python benchmark_device_detection.py <video file or image folder> [max frames]
+"""
+
+import os
+import sys
+import time
+import cv2
+import numpy as np
+
+# Add the current directory to the path so we can import utils
+sys.path.append(os.path.dirname(__file__))
+
+import utils
+
+BACKENDS = [
+    ('pytorch', False),
+    ('onnx', False),
+    ('openvino', False),
+    ('openvino', True),
+]
+
+def load_frames(source, max_frames):
+    """Read recorded frames from a video file or a folder of images"""
+    frames = []
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp')):
+                frame = cv2.imread(os.path.join(source, name))
+                if frame is not None:
+                    frames.append(frame)
+            if len(frames) >= max_frames:
+                break
+    else:
+        cap = cv2.VideoCapture(source)
+        while len(frames) < max_frames:
+            success, frame = cap.read()
+            if not success:
+                break
+            frames.append(frame)
+        cap.release()
+    return frames
+
+def run_backend(model, frames):
+    """Per-frame latencies (ms) and device decisions for one backend"""
+    classes = utils.device_class_ids(model)
+    # Warm up so graph compilation is not measured
+    model.predict(source=[frames[0]], conf=utils.ED_CONFIDENCE, imgsz=utils.ED_IMGSZ,
+                  classes=classes, save=False, verbose=False)
+    latencies = []
+    decisions = []
+    for frame in frames:
+        start = time.perf_counter()
+        result = model.predict(source=[frame], conf=utils.ED_CONFIDENCE, imgsz=utils.ED_IMGSZ,
+                               classes=classes, save=False, verbose=False)[0]
+        latencies.append((time.perf_counter() - start) * 1000)
+        decisions.append(utils.devices_detected(result))
+    return np.array(latencies), decisions
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+    max_frames = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    frames = load_frames(sys.argv[1], max_frames)
+    if not frames:
+        print("❌ No frames found")
+        return
+    print(f"=== Electronic Device Detection Benchmark ({len(frames)} frames) ===")
+
+    baseline = None
+    for backend, int8 in BACKENDS:
+        name = backend + (' (INT8)' if int8 else '')
+        try:
+            model = utils.load_device_model(backend, int8)
+            latencies, decisions = run_backend(model, frames)
+        except Exception as e:
+            print(f"{name:16} ❌ {e}")
+            continue
+        if baseline is None:
+            baseline = decisions
+        agreement = np.mean([a == b for a, b in zip(decisions, baseline)]) * 100
+        print(f"{name:16} mean {latencies.mean():7.1f} ms | p50 {np.percentile(latencies, 50):7.1f} ms | "
+              f"p95 {np.percentile(latencies, 95):7.1f} ms | devices in {sum(decisions):4d} frames | "
+              f"agreement with PyTorch {agreement:5.1f}%")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Result ID Benchmark
+Compares the old get_resultId (load, filter and sort all of result.json) with the
+counter-based allocator at 100k stored results. Runs in a temporary folder, the
+real result log is not touched.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import timeit
+
+# Add the current directory to the path so we can import utils
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import utils
+
+RESULTS = 100000
+
+def legacy_get_resultId():
+    """get_resultId before the allocator"""
+    try:
+        with open('result.json', 'r') as file:
+            try:
+                file_data = json.load(file)
+                if not file_data:
+                    return 1
+                valid_data = [entry for entry in file_data if isinstance(entry.get("Id"), int)]
+                if not valid_data:
+                    return 1
+                valid_data.sort(key=lambda x: x["Id"])
+                return valid_data[-1]["Id"] + 1
+            except json.JSONDecodeError:
+                # File is empty or malformed
+                return 1
+    except FileNotFoundError:
+        # File does not exist
+        return 1
+
+def main():
+    results = [{"Id": i, "Name": f"Student {i}", "TotalMark": 60, "TrustScore": 90, "Status": "Pass",
+                "Date": "2025-01-01", "StId": i, "Link": f"Student {i}_{i:03}Profile.jpg"}
+               for i in range(1, RESULTS + 1)]
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)
+        with open('result.json', 'w') as file:
+            json.dump(results, file, indent=4)
+
+        print(f"=== Result ID Benchmark ({RESULTS} results) ===")
+        runs = 5
+        legacy = timeit.timeit(legacy_get_resultId, number=runs) / runs * 1000
+        print(f"legacy scan + sort:        {legacy:10.3f} ms/call -> {legacy_get_resultId()}")
+
+        # First call migrates result.json and builds the index once
+        first = timeit.timeit(utils.allocate_resultId, number=1) * 1000
+        print(f"allocator, first call:     {first:10.3f} ms (one-time migration + index load)")
+        runs = 1000
+        allocate = timeit.timeit(utils.allocate_resultId, number=runs) / runs * 1000
+        print(f"allocator, steady state:   {allocate:10.3f} ms/call -> {utils.allocate_resultId()}")
+        utils.current_result_id = 42
+        cached = timeit.timeit(utils.get_resultId, number=runs) / runs * 1000
+        print(f"get_resultId during exam:  {cached:10.3f} ms/call (cached id)")
+        print(f"speedup (steady state):    {legacy / allocate:10.1f}x")
+        utils.current_result_id = None
+        os.chdir(cwd)
+
+if __name__ == "__main__":
+    main()
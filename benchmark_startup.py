@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark
+Measures how long `import utils` (and `import app`) takes in a fresh interpreter, and
+optionally how long utils.warm_up() then needs to load the models, microphone and
+profile encodings.
+
+Usage:
+    python benchmark_startup.py [runs] [--warm-up]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Add the current directory to the path so we can import utils
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ['utils', 'app']
+
+def import_time(module):
+    """Wall time (ms) of importing one module in a new interpreter"""
+    code = f"import time; start = time.perf_counter(); import {module}; print((time.perf_counter() - start) * 1000)"
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'import failed')
+    return float(result.stdout.strip().splitlines()[-1])
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    runs = int(args[0]) if args else 5
+    print(f"=== Startup Benchmark ({runs} runs) ===")
+    for module in MODULES:
+        try:
+            times = [import_time(module) for _ in range(runs)]
+        except Exception as e:
+            print(f"import {module:6} ❌ {e}")
+            continue
+        print(f"import {module:6} median {statistics.median(times):8.1f} ms | min {min(times):8.1f} ms | "
+              f"max {max(times):8.1f} ms")
+
+    if '--warm-up' in sys.argv:
+        import utils
+        start = time.perf_counter()
+        utils.warm_up()
+        print(f"utils.warm_up()  {(time.perf_counter() - start) * 1000:8.1f} ms (models, microphone, profile encodings)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Violation Episode Benchmark
+Drives every detector's ViolationEpisode with a synthetic stream of detector states
+(short false alarms and long violations) on a simulated clock, without a camera or
+video files, and reports the cost per update and the episodes found.
+
+Usage:
+    python benchmark_violation_episodes.py [updates]
+"""
+
+import os
+import random
+import sys
+import time
+
+# Add the current directory to the path so we can import utils
+sys.path.append(os.path.dirname(__file__))
+
+import utils
+
+def synthetic_states(normal, violation, updates, rate, seed=0):
+    """(time, state) pairs at `rate` updates/s, alternating normal spells and 0.5-10 s violations"""
+    rng = random.Random(seed)
+    now = 0.0
+    states = []
+    while len(states) < updates:
+        for state, seconds in ((normal, rng.uniform(1, 20)), (violation, rng.uniform(0.5, 10))):
+            for _ in range(max(int(seconds * rate), 1)):
+                states.append((now, state))
+                now += 1 / rate
+    return states[:updates]
+
+def main():
+    updates = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    utils.current_result_id = 1  # Violation entries need a result id, don't look one up
+    violations = {'FaceVerification': 'Verified Student disappeared', 'HeadMovement': 'Looking Left',
+                  'MTOP': 'More than one person is detected.', 'Screen': 'Move away from the Test',
+                  'ElectronicDevice': 'Electronic Device Detected'}
+    print(f"=== Violation Episode Benchmark ({updates} updates per detector) ===")
+    for name, episode in utils.violation_episodes.items():
+        rate = utils.DETECTOR_RATES[name]
+        states = synthetic_states(episode.normal, violations[name], updates, rate)
+        # Same configuration, but evidence goes nowhere
+        bench = utils.ViolationEpisode(episode.normal, utils.ViolationSink(), episode.min_duration,
+                                       episode.hysteresis, episode.debounce, episode.duration_scale, episode.mark)
+        start = time.perf_counter()
+        for now, state in states:
+            bench.update(state, None, now)
+        elapsed = time.perf_counter() - start
+        stats = bench.stats()
+        print(f"{name:17} {elapsed / updates * 1e6:6.2f} us/update | {stats['Episodes']:5d} episodes | "
+              f"{stats['Violations']:5d} violations")
+    utils.recorded_durations.clear()
+    utils.current_result_id = None
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Violation/Result Log Migration Script
+=====================================
+
+violation.json and result.json are now stored as append-only JSON Lines logs
+(violation.jsonl and result.jsonl). The application migrates the old files on first
+use; this script does it up front and can compact the logs afterwards.
+
+Usage:
+    python migrate_json_logs.py migrate   # import violation.json/result.json once
+    python migrate_json_logs.py compact   # rewrite the logs without torn/corrupt lines
+"""
+
+import os
+import sys
+
+# Add the current directory to the path so we can import utils
+sys.path.append(os.path.dirname(__file__))
+
+import utils
+
+LOG_FILES = ['violation.json', 'result.json']
+
+def migrate():
+    """Import the legacy JSON array files into their logs"""
+    for filename in LOG_FILES:
+        if utils.migrate_json_log(filename):
+            print(f"✅ {filename} -> {utils.json_log_path(filename)}")
+        elif os.path.exists(utils.json_log_path(filename)):
+            print(f"ℹ️  {utils.json_log_path(filename)} already exists, nothing to migrate.")
+        else:
+            print(f"ℹ️  {filename} not found, nothing to migrate.")
+
+def compact():
+    """Rewrite every log, dropping lines that are not valid JSON"""
+    for filename in LOG_FILES:
+        kept, dropped = utils.compact_json_log(filename)
+        print(f"✅ {utils.json_log_path(filename)}: kept {kept} entries, dropped {dropped} corrupt lines")
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    if command == 'migrate':
+        migrate()
+    elif command == 'compact':
+        compact()
+    else:
+        print(__doc__)
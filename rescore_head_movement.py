@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Offline Head Movement Re-Scoring
+Runs FaceMesh over a recorded video and re-scores the head direction of every frame
+with the batch head-pose estimator, e.g. after changing the angle thresholds.
+
+Usage:
+    python rescore_head_movement.py <video file> [--flipped] [--compare]
+
+    --flipped   the video is already mirrored (Head Movement clips recorded before the
+                session recording were; clips cut from it are not)
+    --compare   also solve every frame from scratch (no pose tracking) and report how
+                often the two disagree on the head direction
+"""
+
+import os
+import sys
+from collections import Counter
+import cv2
+
+# Add the current directory to the path so we can import utils
+sys.path.append(os.path.dirname(__file__))
+
+import utils
+
+def read_landmarks(path):
+    """FaceMesh landmarks of the student's face in every frame (None where no face was found)"""
+    utils.load_libraries()
+    face_mesh = utils.mp.solutions.face_mesh.FaceMesh(max_num_faces=1,
+                                                      min_detection_confidence=utils.FACE_MESH_CONFIDENCE,
+                                                      min_tracking_confidence=utils.FACE_MESH_CONFIDENCE)
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 20
+    size = None
+    faces = []
+    while True:
+        success, frame = cap.read()
+        if not success:
+            break
+        size = frame.shape[1], frame.shape[0]
+        results = face_mesh.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        faces.append(results.multi_face_landmarks[0] if results.multi_face_landmarks else None)
+    cap.release()
+    return faces, size, fps
+
+def compare_tracking(faces, size, fps, mirror, tracked, directions):
+    """Head directions with solvePnP seeded by the previous pose vs. solved from scratch"""
+    scratch = utils.HeadPoseEstimator(tracking=False).estimate_batch(faces, size[0], size[1], mirror=mirror)
+    pairs = [(i, a, b) for i, (a, b) in enumerate(zip(tracked, scratch)) if a is not None and b is not None]
+    if not pairs:
+        print("No frames with a face to compare")
+        return
+    differences = [max(abs(a[0] - b[0]), abs(a[1] - b[1])) for _, a, b in pairs]
+    disagree = [(i, directions[i], utils.head_direction(*b)) for i, a, b in pairs
+                if directions[i] != utils.head_direction(*b)]
+    print(f"=== Pose tracking vs. from-scratch solve ({len(pairs)} frames with a face) ===")
+    print(f"angle difference: mean {sum(differences) / len(differences):.3f}, max {max(differences):.3f} degrees")
+    print(f"direction disagrees in {len(disagree)} frames ({len(disagree) / len(pairs) * 100:.2f}%)")
+    for i, tracked_direction, scratch_direction in disagree[:20]:
+        print(f"  {i / fps:7.2f}s  tracked {tracked_direction:14} scratch {scratch_direction}")
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if not args:
+        print(__doc__)
+        return
+    faces, size, fps = read_landmarks(args[0])
+    if size is None:
+        print("❌ No frames found")
+        return
+    mirror = '--flipped' not in sys.argv
+    poses = utils.HeadPoseEstimator().estimate_batch(faces, size[0], size[1], mirror=mirror)
+    directions = [utils.head_direction(*pose) if pose is not None else "No Face" for pose in poses]
+
+    print(f"=== Head Movement Re-Scoring ({len(directions)} frames, {fps:.0f} fps) ===")
+    for direction, count in Counter(directions).most_common():
+        print(f"{direction:14} {count:6d} frames ({count / fps:6.1f}s)")
+    # Runs of frames where the student was not looking forward
+    start = None
+    for i, direction in enumerate(directions + ["Forward"]):
+        if direction not in ("Forward", "No Face") and start is None:
+            start = i
+        elif direction in ("Forward", "No Face") and start is not None:
+            print(f"  {start / fps:7.2f}s - {i / fps:7.2f}s  {directions[start]}")
+            start = None
+    if '--compare' in sys.argv:
+        compare_tracking(faces, size, fps, mirror, poses, directions)
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,23 @@ CREATE TABLE IF NOT EXISTS students (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Indexes for the keyset pagination of the admin student listing (by ID or by Name).
+-- Created outside CREATE TABLE so databases set up before them get them too; MySQL has
+-- no CREATE INDEX IF NOT EXISTS, so each one is only created when it is missing.
+SET @missing = (SELECT COUNT(*) = 0 FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = 'students' AND index_name = 'idx_role_id');
+SET @sql = IF(@missing, 'CREATE INDEX idx_role_id ON students (Role, ID)', 'DO 0');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SET @missing = (SELECT COUNT(*) = 0 FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = 'students' AND index_name = 'idx_role_name');
+SET @sql = IF(@missing, 'CREATE INDEX idx_role_name ON students (Role, Name, ID)', 'DO 0');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
 -- Insert a default admin user
 INSERT INTO students (Name, Email, Password, Role) VALUES 
 ('Admin User', 'admin@example.com', 'admin123', 'ADMIN');
@@ -0,0 +1,71 @@
+// Exam result listing, loaded page by page from /api/results
+const resultRows = document.getElementById('resultRows');
+const resultFilters = document.getElementById('resultFilters');
+const loadMoreResults = document.getElementById('loadMore');
+let resultCursor = null;
+
+function resultCell(text) {
+	const td = document.createElement('td');
+	td.textContent = text;
+	return td;
+}
+
+function resultRow(result) {
+	const tr = document.createElement('tr');
+
+	const name = document.createElement('td');
+	const p = document.createElement('p');
+	p.textContent = result.Name;
+	name.appendChild(p);
+	tr.appendChild(name);
+
+	tr.appendChild(resultCell(result.Date));
+
+	const status = document.createElement('td');
+	const kbd = document.createElement('kbd');
+	kbd.className = result.Status === 'Pass' ? 'bg-success' : 'bg-danger';
+	kbd.textContent = result.Status;
+	const statusText = document.createElement('p');
+	statusText.appendChild(kbd);
+	status.appendChild(statusText);
+	tr.appendChild(status);
+
+	tr.appendChild(resultCell(result.TotalMark + '%'));
+
+	const details = document.createElement('td');
+	const link = document.createElement('a');
+	link.href = resultRows.dataset.details.replace('__id__', encodeURIComponent(result.Id));
+	link.innerHTML = '<button type="button" class="btn btn-outline-info">Details</button>';
+	details.appendChild(link);
+	tr.appendChild(details);
+	return tr;
+}
+
+function loadResults(reset) {
+	const params = new URLSearchParams();
+	new FormData(resultFilters).forEach((value, key) => {
+		if (value !== '') params.append(key, value);
+	});
+	if (reset) {
+		resultCursor = null;
+		resultRows.innerHTML = '';
+	}
+	if (resultCursor !== null) params.append('after', resultCursor);
+
+	fetch(resultRows.dataset.source + '?' + params.toString())
+		.then(response => response.json())
+		.then(data => {
+			data.results.forEach(result => resultRows.appendChild(resultRow(result)));
+			resultCursor = data.next;
+			loadMoreResults.style.display = resultCursor === null ? 'none' : '';
+		});
+}
+
+resultFilters.addEventListener('submit', function (event) {
+	event.preventDefault();
+	loadResults(true);
+});
+loadMoreResults.addEventListener('click', function () {
+	loadResults(false);
+});
+loadResults(true);
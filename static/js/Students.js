@@ -0,0 +1,90 @@
+// Student listing, loaded page by page from /api/students
+const studentRows = document.getElementById('studentRows');
+const studentFilters = document.getElementById('studentFilters');
+const loadMoreStudents = document.getElementById('loadMore');
+const editForm = document.querySelector('#modaledit form');
+let studentCursor = null;
+
+function studentCell(text) {
+	const td = document.createElement('td');
+	td.textContent = text;
+	return td;
+}
+
+function studentRow(student) {
+	const tr = document.createElement('tr');
+	tr.appendChild(studentCell(student.Id));
+	tr.appendChild(studentCell(student.Name));
+	tr.appendChild(studentCell(student.Email));
+	tr.appendChild(studentCell(student.Role));
+
+	const actions = document.createElement('td');
+	const edit = document.createElement('a');
+	edit.href = '#';
+	edit.setAttribute('data-toggle', 'modal');
+	edit.setAttribute('data-target', '#modaledit');
+	edit.innerHTML = "<i class='bx bxs-edit' style=\"color: #5f9ea0;\"></i>";
+	edit.addEventListener('click', function () {
+		editForm.elements['id'].value = student.Id;
+		editForm.elements['name'].value = student.Name;
+		editForm.elements['email'].value = student.Email;
+		editForm.elements['password'].value = '';
+	});
+	actions.appendChild(edit);
+
+	const remove = document.createElement('form');
+	remove.method = 'POST';
+	remove.action = '/deleteStudent';
+	remove.style.display = 'inline';
+	remove.addEventListener('submit', function (event) {
+		if (!confirm('Are You Sure You Want To Delete This Student? This action cannot be undone.')) {
+			event.preventDefault();
+		}
+	});
+	const studentId = document.createElement('input');
+	studentId.type = 'hidden';
+	studentId.name = 'student_id';
+	studentId.value = student.Id;
+	remove.appendChild(studentId);
+	const button = document.createElement('button');
+	button.type = 'submit';
+	button.style.cssText = 'background: none; border: none; cursor: pointer; padding: 0;';
+	button.innerHTML = "<i class='bx bxs-message-square-x' style=\"color: #aa2e49;\"></i>";
+	remove.appendChild(button);
+	actions.appendChild(remove);
+
+	tr.appendChild(actions);
+	return tr;
+}
+
+function loadStudents(reset) {
+	const params = new URLSearchParams();
+	new FormData(studentFilters).forEach((value, key) => {
+		if (value !== '') params.append(key, value);
+	});
+	if (reset) {
+		studentCursor = null;
+		studentRows.innerHTML = '';
+	}
+	if (studentCursor !== null) {
+		params.append('after_id', studentCursor.after_id);
+		params.append('after_name', studentCursor.after_name);
+	}
+
+	fetch(studentRows.dataset.source + '?' + params.toString())
+		.then(response => response.json())
+		.then(data => {
+			data.students.forEach(student => studentRows.appendChild(studentRow(student)));
+			studentCursor = data.next;
+			loadMoreStudents.style.display = studentCursor === null ? 'none' : '';
+		});
+}
+
+studentFilters.addEventListener('submit', function (event) {
+	event.preventDefault();
+	loadStudents(true);
+});
+loadMoreStudents.addEventListener('click', function () {
+	loadStudents(false);
+});
+loadStudents(true);
@@ -1,8 +1,6 @@
 import sys
-import face_recognition
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, Future
 import cv2
-import mediapipe as mp
 import numpy as np
 import time
 import math
@@ -15,65 +13,41 @@ import pyautogui
 import pygetwindow as gw
 import webbrowser
 import pyperclip
-from ultralytics import YOLO
 import threading
+import queue
 from multiprocessing import Process
 import pyaudio
-import struct
 import wave
 import datetime
-import subprocess
+import bisect
+import hashlib
+import uuid
 
 #Variables
 #All Related
 Globalflag = False
 Student_Name = ''
-start_time = [0, 0, 0, 0, 0]
-end_time = [0, 0, 0, 0, 0]
 recorded_durations = []
-prev_state = ['Verified Student appeared', 
-              "Forward", 
-              "Only one person is detected",
-              "Stay in the Test",
-              "No Electronic Device Detected"]
-flag = [False, False, False, False, False]
-
-# Individual FPS variables for each video writer
-FACE_DETECTION_FPS = 20      # Writer[0] - Face Detection violations
-HEAD_MOVEMENT_FPS = 20       # Writer[1] - Head Movement violations  
-MTOP_DETECTION_FPS = 20      # Writer[2] - Multiple Person violations
-SCREEN_DETECTION_FPS = 5     # Writer[3] - Screen Detection violations
-ELECTRONIC_DEVICE_FPS = 10   # Writer[4] - Electronic Device violations
-
-capb= cv2.VideoCapture(0)
-width= int(capb.get(cv2.CAP_PROP_FRAME_WIDTH))
-height= int(capb.get(cv2.CAP_PROP_FRAME_HEIGHT))
-capb.release()
-# Set default dimensions for electronic device detection (can be adjusted as needed)
-EDWidth = 1920
-EDHeight = 1080
+
+# Every source is recorded once for the whole exam; violations are time ranges cut out of it
+SESSION_CAMERA_FPS = 20  # Camera track frame rate (the camera producer's target rate)
+SCREEN_DETECTION_FPS = 5  # Screen track frame rate
+SESSION_SEGMENT_SECS = 10  # The tracks are written in segments of this length, only closed segments are cut
+SESSION_RETENTION_SECS = 300  # Older segments are deleted unless a violation still needs them
+EPISODE_MIN_DURATION = 3  # Seconds a violation episode must last to count
+EPISODE_HYSTERESIS = 1  # Detector runs in a row that must see a violation before an episode opens
+EPISODE_DEBOUNCE = 0  # Seconds back to normal that are still treated as part of the episode
+
 # Ensure the OutputVideos directory exists
 video_dir = os.path.join("static", "OutputVideos")
 os.makedirs(video_dir, exist_ok=True)
 
-# Create video files in the proper directory
-video = [
-    os.path.join(video_dir, str(random.randint(1,50000))+".mp4"),
-    os.path.join(video_dir, str(random.randint(1,50000))+".mp4"),
-    os.path.join(video_dir, str(random.randint(1,50000))+".mp4"),
-    os.path.join(video_dir, str(random.randint(1,50000))+".mp4"),
-    os.path.join(video_dir, str(random.randint(1,50000))+".mp4")
-]
-writer = [cv2.VideoWriter(video[0], cv2.VideoWriter_fourcc(*'mp4v'), FACE_DETECTION_FPS, (width,height)), 
-          cv2.VideoWriter(video[1], cv2.VideoWriter_fourcc(*'mp4v'), HEAD_MOVEMENT_FPS, (width,height)), 
-          cv2.VideoWriter(video[2], cv2.VideoWriter_fourcc(*'mp4v'), MTOP_DETECTION_FPS, (width,height)), 
-          cv2.VideoWriter(video[3], cv2.VideoWriter_fourcc(*'mp4v'), SCREEN_DETECTION_FPS, (1920, 1080)), 
-          cv2.VideoWriter(video[4], cv2.VideoWriter_fourcc(*'mp4v'), ELECTRONIC_DEVICE_FPS , (EDWidth,EDHeight))]
-
 #More than One Person Related
-mpFaceDetection = mp.solutions.face_detection  # Detect the face
-mpDraw = mp.solutions.drawing_utils  # Draw the required Things for BBox
-faceDetection = mpFaceDetection.FaceDetection(0.5)# Increased sensitivity: 0.75 -> 0.5 for better multiple person detection
+# One FaceMesh pass per camera frame is shared by the MTOP, head movement and face verification checks
+FACE_MESH_MAX_FACES = 4  # Faces FaceMesh looks for, so more than one person can be counted
+FACE_MESH_CONFIDENCE = 0.5  # Increased sensitivity: 0.75 -> 0.5 for better multiple person detection
+FACE_ANALYSIS_MAX_LAG = 2  # Frames a detector may be away from the last analysed frame and still reuse its analysis
+face_analyzer = None  # FaceAnalyzer, created by get_face_analyzer()
 
 #Screen Related
 # List of supported browsers (just need to detect if we're in a browser)
@@ -103,8 +77,65 @@ for i in range(len(class_list)):
     g = random.randint(0, 255)
     b = random.randint(0, 255)
     detection_colors.append((b, g, r))
-model = YOLO("yolo11n.pt")
+ED_MODEL = "yolo11n.pt"
+ED_BACKEND = 'pytorch'  # 'pytorch', 'onnx' (ONNX Runtime) or 'openvino'
+ED_INT8 = False  # INT8 quantization of the exported graph (OpenVINO only)
+ED_IMGSZ = 640  # YOLO input size (its default), fixed square input of the exported graph
+DEVICE_LABELS = ('cell phone', 'remote', 'laptop', 'laptop,book')  # Classes that count as an electronic device
+
+def load_device_model(backend=None, int8=None, imgsz=None):
+    """Load the electronic-device model for the chosen backend (ED_BACKEND, ED_INT8 and ED_IMGSZ by default), exporting the graph on first use"""
+    # Read when called, so changing the constants moves this and the per-frame path together
+    backend = ED_BACKEND if backend is None else backend
+    int8 = ED_INT8 if int8 is None else int8
+    imgsz = ED_IMGSZ if imgsz is None else imgsz
+    load_libraries()
+    if backend == 'pytorch':
+        return YOLO(ED_MODEL)
+    if backend not in ('onnx', 'openvino'):
+        raise ValueError(f"Unknown electronic device detection backend: {backend}")
+    if int8 and backend != 'openvino':
+        print("INT8 quantization is only available for the OpenVINO backend, using FP32")
+        int8 = False
+    # The input size is part of the name, so a graph exported at another imgsz is never reused
+    base = os.path.splitext(ED_MODEL)[0] + f"_{imgsz}"
+    if backend == 'onnx':
+        exported = base + ".onnx"
+    else:
+        exported = base + ("_int8" if int8 else "") + "_openvino_model"
+    if not os.path.exists(exported):
+        # Fixed input shape (one imgsz square frame), so the runtime can plan for it; the
+        # predictor letterboxes every frame to that square
+        print(f"Exporting {ED_MODEL} to {backend} (imgsz={imgsz}, int8={int8})...")
+        os.replace(YOLO(ED_MODEL).export(format=backend, imgsz=imgsz, int8=int8, dynamic=False), exported)
+    return YOLO(exported, task='detect')
+
+def devices_detected(result, scale=1.0):
+    """True if a YOLO Result contains one of the DEVICE_LABELS that is not too small to matter"""
+    boxes = result.boxes
+    if len(boxes) == 0:
+        return False
+    classes = boxes.cls.cpu().numpy().astype(int)
+    # Box sizes in pixels of the full camera frame (scale maps the model input back to it)
+    sizes = boxes.xywh.cpu().numpy()[:, 2:] * scale
+    big_enough = (sizes >= ED_MIN_BOX_SIZE).all(axis=1)
+    return any(result.names[cls] in DEVICE_LABELS for cls in np.unique(classes[big_enough]))
+
+def device_class_ids(model):
+    """Class ids of the DEVICE_LABELS, so YOLO only looks for those instead of all 80 COCO classes"""
+    return [cls for cls, name in model.names.items() if name in DEVICE_LABELS]
+
+device_model = None  # Loaded by get_device_model()
+DEVICE_CLASS_IDS = None
+yolo_server = None
 EDFlag = False
+ED_CONFIDENCE = 0.25  # Reduced sensitivity: 0.45 -> 0.25
+ED_MIN_BOX_SIZE = 20  # Ignore device boxes narrower or shorter than this (pixels on the camera frame)
+ED_USE_ROI = False  # Only look at the region around the student's face instead of the whole frame
+ED_ROI_MAX_AGE = 2  # Seconds a face box from MTOP stays usable as the region of interest
+student_face_boxes = (0, [])  # (time, [(x, y, w, h), ...]) of the faces MTOP saw last
+YOLO_BATCH_SIZE = 8  # Most frames run through YOLO in one call
+YOLO_BATCH_DEADLINE = 0.05  # Seconds the batch server waits for more frames before running a partial batch
 
 #Voice Related
 TRIGGER_RMS = 15  # start recording above 15
@@ -120,41 +151,245 @@ CHUNK = int(RATE * FRAME_SECS)
 CUSHION_FRAMES = int(CUSHION_SECS / FRAME_SECS)
 TIMEOUT_FRAMES = int(TIMEOUT_SECS / FRAME_SECS)
 f_name_directory = 'static/OutputAudios'  # Fixed path to use relative directory
+
+#Violation/Result Log Related
+JSON_LOG_FSYNC_EVERY = 20  # fsync a log after this many appends...
+JSON_LOG_FSYNC_INTERVAL = 1.0  # ...or once this many seconds have passed since the last fsync
+json_log_lock = threading.Lock()
+json_logs = {}  # Open append handles: log path -> {"File", "Unsynced", "LastSync"}
+json_logs_migrated = set()
+JSON_LOG_KEYS = {'violation.json': 'RId', 'result.json': 'Id'}  # Field each log is indexed by
+json_indexes = {}  # filename -> JsonLogIndex
+RESULT_ID_COUNTER = 'result_id.counter'  # Last allocated result id
+result_id_lock = threading.Lock()
+current_result_id = None  # Result id of the exam in progress (set by the exam routes)
+RESULT_SCAN_LIMIT = 5000  # Most result rows one page request looks at, selective filters continue on the next request
+
+#Violation Finalization Related
+FINALIZE_WORKERS = 2  # Background threads that cut and log finished violation clips
+FINALIZE_RETRIES = 2  # Extra attempts for a failed finalization job
+
+#Video Encoding Related
+# Recordings are encoded once, in-process, as browser-playable H.264 (PyAV + libx264)
+VIDEO_CODEC = 'libx264'
+VIDEO_PRESET = 'ultrafast'  # Least CPU per frame, the detectors need it more
+VIDEO_CRF = 28  # Constant quality (lower is better), capped at VIDEO_MAX_BITRATE
+VIDEO_MAX_BITRATE = '1000k'  # The data rate the clips used to be transcoded to
+VIDEO_KEYFRAME_SECS = 1  # Clips are cut at keyframes, so they may start up to this much early
+av = None  # PyAV, imported by load_pyav() (False if it is not installed, OpenCV mp4v is used then)
+
+#Model Loading Related
+# face_recognition, MediaPipe and Ultralytics (PyTorch) take seconds to import and the models,
+# microphone and profile encodings even longer, so they are loaded on first use / by warm_up()
+face_recognition = None
+mp = None
+YOLO = None
+models_lock = threading.RLock()
+recorder = None  # Recorder instance (utils.a)
+face_recognizer = None  # FaceRecognition instance (utils.fr)
+models_warm = False  # Set once warm_up() has loaded everything
+
+#Face Verification Related
+PROFILES_DIR = 'static/Profiles'
+PROFILE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif')  # Only image files are encoded
+FACE_ENCODING_CACHE = 'face_encodings.npz'  # Profile encodings keyed by file name, mtime and content hash
+FACE_MATCH_TOLERANCE = 0.85  # Largest face distance that can count as the student
+FACE_MIN_CONFIDENCE = 84  # Lowest face_confidence (%) that counts as the student
+FACE_IMPOSTOR_CHECK = True  # Reject a face that is closer to another enrolled student than to the student
+FACE_TRACKING = True  # Verify the student once, then follow the face box with a tracker
+FACE_TRACKER = 'KCF'  # OpenCV tracker: 'KCF', 'CSRT' (both opencv-contrib) or 'MIL'
+FACE_REVERIFY_SECS = 5.0  # A tracked face is verified again after this long
+FACE_BOX_JUMP = 0.5  # Verify again if the box center moves more than this fraction of its width between frames
 # Capture
 cap = None
-
-# Camera Producer-Consumer System (Double Buffer Implementation)
-write_frame = None  # Producer writes to this buffer
-read_frame = None   # Consumers read from this buffer
-frame_lock = threading.Lock()  # Only for quick buffer swap
-frame_ready = threading.Event()
+# Live preview of the face input page
+PREVIEW_FPS = 15  # Frames per second sent to the viewers
+PREVIEW_JPEG_QUALITY = 80
+PREVIEW_DETECT_WIDTH = 320  # Faces are found on a grayscale copy scaled down to this width
+PREVIEW_CASCADE = 'Haarcascades/haarcascade_frontalface_default.xml'
+PREVIEW_RETRY_SECS = 0.1  # Wait after a failed camera read
+
+# Camera Producer-Consumer System (Shared Frame Ring Buffer)
+FRAME_RING_SIZE = 8  # Number of preallocated frame slots shared by all consumers
+SMALL_FRAME_SCALE = 0.25  # Face verification runs on a 1/4 size frame
+MOTION_FRAME_SIZE = (64, 48)  # Thumbnail used for the frame-difference motion score
+
+# Detector Scheduling
+DETECTOR_RATES = {  # Target runs per second of each detector
+    'FaceVerification': 2,
+    'HeadMovement': 10,
+    'MTOP': 5,
+    'ElectronicDevice': 1,
+    'Screen': 5,
+}
+MOTION_LOW = 2.0  # Motion score (mean pixel difference, 0-255) below which the scene counts as still
+MOTION_HIGH = 12.0  # Motion score above which the scene counts as busy
+MOTION_SLOW_FACTOR = 0.5  # Rate multiplier for a still scene
+MOTION_FAST_FACTOR = 2.0  # Rate multiplier for a busy scene
+YOLO_INPUT_SIZE = ED_IMGSZ  # Longest side of the frame handed to YOLO
 camera_thread = None
 
 
 #Database and Files Related
+# violation.json/result.json are stored as append-only JSON Lines logs (violation.jsonl/result.jsonl)
+def json_log_path(filename):
+    return os.path.splitext(filename)[0] + '.jsonl'
+
+# function to import a legacy JSON array file into its log (runs once per file)
+def migrate_json_log(filename):
+    path = json_log_path(filename)
+    if os.path.exists(path) or not os.path.exists(filename):
+        return False
+    try:
+        with open(filename, 'r') as file:
+            file_data = json.load(file)
+        if not isinstance(file_data, list):
+            file_data = []
+    except json.JSONDecodeError:
+        file_data = []
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as log:
+        for entry in file_data:
+            log.write(json.dumps(entry) + '\n')
+        log.flush()
+        os.fsync(log.fileno())
+    os.replace(temp_path, path)
+    # Keep the old file as a backup, but out of the way so it is not mistaken for live data
+    os.replace(filename, filename + '.migrated')
+    print(f"Migrated {len(file_data)} entries from {filename} to {path}")
+    return True
+
+def ensure_json_log(filename):
+    if filename not in json_logs_migrated:
+        migrate_json_log(filename)
+        json_logs_migrated.add(filename)
+
 # function to add data to JSON
 def write_json(new_data, filename='violation.json'):
-    # Create file with empty list if it doesn't exist
-    if not os.path.exists(filename):
-        with open(filename, 'w') as f:
-            json.dump([], f)
-
-    # Now open and handle possible empty/corrupt file
+    line = json.dumps(new_data) + '\n'
     try:
-        with open(filename, 'r+') as file:
-            try:
-                file_data = json.load(file)
-                if not isinstance(file_data, list):
-                    file_data = []
-            except json.JSONDecodeError:
-                file_data = []
-            file_data.append(new_data)
-            file.seek(0)
-            json.dump(file_data, file, indent=4)
-            file.truncate()
+        with json_log_lock:
+            ensure_json_log(filename)
+            path = json_log_path(filename)
+            log = json_logs.get(path)
+            if log is None:
+                log = {"File": open(path, 'a'), "Unsynced": 0, "LastSync": time.time()}
+                json_logs[path] = log
+            # One appended line per entry, no read-modify-write of the whole file
+            log["File"].write(line)
+            log["File"].flush()
+            log["Unsynced"] += 1
+            if log["Unsynced"] >= JSON_LOG_FSYNC_EVERY or time.time() - log["LastSync"] >= JSON_LOG_FSYNC_INTERVAL:
+                os.fsync(log["File"].fileno())
+                log["Unsynced"] = 0
+                log["LastSync"] = time.time()
     except Exception as e:
         print(f"Error in write_json: {e}")
 
+class JsonLogIndex:
+    """In-process index of one log, keyed by result id.
+
+    The log is read once; after that only the lines appended since the last lookup
+    (by this or any other process) are parsed, so per-exam lookups and trust scores
+    no longer depend on how many violations were ever recorded.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.path = json_log_path(filename)
+        self.key = JSON_LOG_KEYS.get(filename)
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.rows = []
+        self.by_key = {}
+        self.ids = []  # Sorted integer keys, for keyset pagination
+        self.marks = {}
+        self.max_id = 0
+        self.offset = 0
+
+    def add(self, entry):
+        self.rows.append(entry)
+        key = entry.get(self.key) if isinstance(entry, dict) else None
+        if key is None:
+            return
+        if key not in self.by_key and isinstance(key, int):
+            bisect.insort(self.ids, key)  # Ids arrive almost sorted, so this is nearly always an append
+        self.by_key.setdefault(key, []).append(entry)
+        self.marks[key] = self.marks.get(key, 0) + entry.get("Mark", 0)
+        if isinstance(key, int) and key > self.max_id:
+            self.max_id = key
+
+    def refresh(self):
+        """Parse whatever was appended to the log since the last call"""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        if size < self.offset:
+            self.clear()  # The log was replaced (compaction), read it again
+        if size == self.offset:
+            return
+        with open(self.path, 'rb') as log:
+            log.seek(self.offset)
+            chunk = log.read(size - self.offset)
+        # Only consume complete lines, a half-written last line is picked up next time
+        end = chunk.rfind(b'\n') + 1
+        for line in chunk[:end].splitlines():
+            try:
+                self.add(json.loads(line))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+        self.offset += end
+
+def json_index(filename):
+    """Up to date index of a log"""
+    with json_log_lock:
+        ensure_json_log(filename)
+        index = json_indexes.get(filename)
+        if index is None:
+            index = json_indexes[filename] = JsonLogIndex(filename)
+    with index.lock:
+        index.refresh()
+    return index
+
+# function to flush the pending appends of every log to disk
+def sync_json_logs():
+    with json_log_lock:
+        for log in json_logs.values():
+            if log["Unsynced"]:
+                os.fsync(log["File"].fileno())
+                log["Unsynced"] = 0
+                log["LastSync"] = time.time()
+
+# function to rewrite a log without its torn/corrupt lines
+def compact_json_log(filename='violation.json'):
+    with json_log_lock:
+        ensure_json_log(filename)
+        path = json_log_path(filename)
+        log = json_logs.pop(path, None)
+        if log is not None:
+            log["File"].close()
+        if not os.path.exists(path):
+            return 0, 0
+        kept = dropped = 0
+        temp_path = path + '.tmp'
+        with open(path, 'r') as source, open(temp_path, 'w') as target:
+            for line in source:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    dropped += 1
+                    continue
+                target.write(json.dumps(entry) + '\n')
+                kept += 1
+            target.flush()
+            os.fsync(target.fileno())
+        os.replace(temp_path, path)
+        json_indexes.pop(filename, None)  # Byte offsets changed, rebuild on next lookup
+    return kept, dropped
+
 #Function to move the files to the Output Folders
 def move_file_to_output_folder(file_name,folder_name='OutputVideos'):
     # Get the current working directory (project folder)
@@ -171,273 +406,559 @@ def move_file_to_output_folder(file_name,folder_name='OutputVideos'):
     except shutil.Error as e:
         print(f"Error: Failed to move the file. {e}")
 
-#Function to reduce video file's data rate to 100 kbps
-def reduceBitRate(input_file, output_file):
-    target_bitrate = "1000k"  # Set your desired target bitrate here
-    
-    # Try to find FFmpeg executable
-    ffmpeg_paths = [
-        "ffmpeg",  # If FFmpeg is in PATH
-        "C:/Program Files/ffmpeg/bin/ffmpeg.exe",
-        "C:/ffmpeg/bin/ffmpeg.exe",
-        "C:/Users/kaungmyat/Downloads/ffmpeg-2023-08-28-git-b5273c619d-essentials_build/ffmpeg-2023-08-28-git-b5273c619d-essentials_build/bin/ffmpeg.exe"
-    ]
-    
-    ffmpeg_path = None
-    for path in ffmpeg_paths:
-        try:
-            # Test if FFmpeg exists and is executable
-            result = subprocess.run([path, "-version"], 
-                                  capture_output=True, 
-                                  text=True, 
-                                  timeout=5)
-            if result.returncode == 0:
-                ffmpeg_path = path
-                break
-        except (subprocess.TimeoutExpired, FileNotFoundError, OSError):
-            continue
-    
-    if not ffmpeg_path:
-        print("FFmpeg not found. Skipping bitrate conversion.")
-        print("Install FFmpeg or add it to PATH for video compression.")
-        # Just copy the file if FFmpeg is not available
-        try:
-            shutil.copy2(input_file, output_file)
-            print(f"Copied {input_file} to {output_file} (no compression)")
-        except Exception as e:
-            print(f"Error copying file: {e}")
+#Function to cut [start, end] out of consecutive recorded segments without re-encoding
+def extract_clip(pieces, start, end, output_file):
+    if not load_pyav():
+        copy_clip_frames(pieces, start, end, output_file)
         return
-    
-    # Run FFmpeg command to lower the bitrate
-    command = [
-        ffmpeg_path,
-        "-i", input_file,
-        "-b:v", target_bitrate,
-        "-c:v", "libx264",
-        "-c:a", "aac",
-        "-strict", "experimental",
-        "-b:a", "192k",
-        "-y",  # Overwrite output file
-        output_file
-    ]
-    
+    output = av.open(output_file, 'w', container_options={'movflags': '+faststart'})
+    stream = None
+    clip_start = None  # Recording time of the clip's first (key)frame
     try:
-        result = subprocess.run(command, 
-                              capture_output=True, 
-                              text=True, 
-                              timeout=30)
-        if result.returncode == 0:
-            print("Bitrate conversion completed.")
-        else:
-            print(f"FFmpeg error: {result.stderr}")
-            # Fallback to copying
-            shutil.copy2(input_file, output_file)
-    except subprocess.TimeoutExpired:
-        print("FFmpeg timeout. Copying file without compression.")
-        shutil.copy2(input_file, output_file)
-    except Exception as e:
-        print(f"Error during conversion: {e}")
-        shutil.copy2(input_file, output_file)
+        for piece in pieces:
+            with av.open(piece["Path"]) as source:
+                video = source.streams.video[0]
+                if stream is None:
+                    stream = output.add_stream_from_template(video)
+                gop = []  # Packets since the last keyframe before the clip start
+                for packet in source.demux(video):
+                    if packet.pts is None:
+                        continue
+                    # The segments play back in wall-clock time, a packet's time is its offset from the segment start
+                    at = piece["Start"] + float(packet.pts * packet.time_base)
+                    if at >= end:
+                        break
+                    if clip_start is None:
+                        if packet.is_keyframe:
+                            gop = []
+                        gop.append((at, packet))
+                        if at < start:
+                            continue
+                        clip_start = gop[0][0]
+                        queued, gop = gop, []
+                    else:
+                        queued = [(at, packet)]
+                    for at, packet in queued:
+                        packet.pts = packet.dts = round((at - clip_start) / packet.time_base)
+                        packet.stream = stream
+                        output.mux(packet)
+    finally:
+        output.close()
+    if clip_start is None:
+        raise RuntimeError(f"No frames recorded between {start} and {end}")
+
+#Function to cut [start, end] out of the segments with OpenCV (re-encodes, used without PyAV)
+def copy_clip_frames(pieces, start, end, output_file):
+    out = None
+    for piece in pieces:
+        capture = cv2.VideoCapture(piece["Path"])
+        fps = capture.get(cv2.CAP_PROP_FPS) or SESSION_CAMERA_FPS
+        first = max(0, round((start - piece["Start"]) * fps))
+        last = round((end - piece["Start"]) * fps)
+        capture.set(cv2.CAP_PROP_POS_FRAMES, first)
+        for _ in range(first, last):
+            success, img = capture.read()
+            if not success:
+                break
+            if out is None:
+                out = open_video_writer(output_file, fps, (img.shape[1], img.shape[0]))
+            out.write(img)
+        capture.release()
+    if out is None:
+        raise RuntimeError(f"No frames recorded between {start} and {end}")
+    out.release()
+
+class ViolationFinalizer:
+    """Background queue that finishes violation clips off the detector threads.
+
+    A detector only submits the violation; a bounded pool of workers then creates its
+    clip in one pass (`prepare`, e.g. cuts it out of the session recording), appends the
+    violation to violation.json and runs `done`, retrying failed jobs. The clip is best
+    effort: one that could not be finished is removed and the violation is still logged,
+    with an empty Link. Only unfinished jobs are kept, finished ones are counted.
+    """
+
+    def __init__(self, workers=FINALIZE_WORKERS, retries=FINALIZE_RETRIES):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ViolationFinalizer')
+        self.retries = retries
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+        self.jobs = {}  # Queued and running jobs only
+        self.finished = {"done": 0, "failed": 0}
+        self.next_id = 1
+
+    def submit(self, output_file, violation, prepare=None, done=None):
+        """Queue a violation and the creation of its clip, returns the job id"""
+        with self.lock:
+            job_id = self.next_id
+            self.next_id += 1
+            self.jobs[job_id] = {"Output": output_file, "Violation": violation, "Prepare": prepare, "Done": done,
+                                 "Status": "queued", "Attempts": 0, "Error": ""}
+        self.executor.submit(self.run, job_id)
+        return job_id
+
+    def run(self, job_id):
+        job = self.jobs[job_id]
+        while True:
+            job["Status"] = "running"
+            job["Attempts"] += 1
+            try:
+                if job["Prepare"] is not None:
+                    job["Prepare"]()
+                    if not os.path.exists(job["Output"]):
+                        raise FileNotFoundError(f"{job['Output']} was not created")
+                job["Status"] = "done"
+                break
+            except Exception as e:
+                job["Error"] = str(e)
+                if job["Attempts"] > self.retries:
+                    print(f"Violation clip failed for {job['Output']}: {e}, it is logged without a clip")
+                    job["Status"] = "failed"
+                    job["Violation"]["Link"] = ""
+                    try:
+                        os.remove(job["Output"])
+                    except OSError:
+                        pass
+                    break
+                time.sleep(job["Attempts"])  # Back off before retrying
+        # The violation counts towards the trust score whether or not its clip was made
+        write_json(job["Violation"])
+        if job["Done"] is not None:
+            job["Done"]()
+        with self.idle:
+            del self.jobs[job_id]
+            self.finished[job["Status"]] += 1
+            self.idle.notify_all()
+
+    def pending_outputs(self):
+        """Clips that still belong to an unfinished job"""
+        with self.lock:
+            return {job["Output"] for job in self.jobs.values()}
+
+    def wait_idle(self, timeout=60):
+        """Block until every queued job is done (used before the trust score is computed)"""
+        with self.idle:
+            return self.idle.wait_for(lambda: not self.jobs, timeout)
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.finished)
+            for job in self.jobs.values():
+                counts[job["Status"]] = counts.get(job["Status"], 0) + 1
+        return counts
+
+violation_finalizer = ViolationFinalizer()
 
 #Recordings related
-#Recording Function for Face Verification
-def faceDetectionRecording(img, text):
-    global start_time, end_time, recorded_durations, prev_state, flag, writer, width, height
-    print("Running FaceDetection Recording Function")
-    print(text)
-    if text != 'Verified Student appeared' and prev_state[0] == 'Verified Student appeared':
-        start_time[0] = time.time()
-        for _ in range(2):
-            writer[0].write(img)
-    elif text != 'Verified Student appeared' and str(text) == prev_state[0] and (time.time() - start_time[0]) > 3:
-        flag[0] = True
-        for _ in range(2):
-            writer[0].write(img)
-    elif text != 'Verified Student appeared' and str(text) == prev_state[0] and (time.time() - start_time[0]) <= 3:
-        flag[0] = False
-        for _ in range(2):
-            writer[0].write(img)
-    else:
-        if prev_state[0] != "Verified Student appeared":
-            writer[0].release()
-            end_time[0] = time.time()
-            duration = math.ceil((end_time[0] - start_time[0]) / 3)
-            outputVideo = os.path.join(video_dir, 'FDViolation' + os.path.basename(video[0]))
-            FDViolation = {
-                "Name": prev_state[0],
-                "Time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start_time[0])),
-                "Duration": str(duration) + " seconds",
-                "Mark": math.floor(2 * duration),
-                "Link": outputVideo,
-                "RId": get_resultId()
-            }
-            if flag[0]:
-                recorded_durations.append(FDViolation)
-                write_json(FDViolation)
-                reduceBitRate(video[0], outputVideo)
-                move_file_to_output_folder(outputVideo)
-            os.remove(video[0])
-            print(recorded_durations)
-            video[0] = os.path.join(video_dir, str(random.randint(1, 50000)) + ".mp4")
-            writer[0] = cv2.VideoWriter(video[0], cv2.VideoWriter_fourcc(*'mp4v'), FACE_DETECTION_FPS, (width, height))
-            flag[0] = False
-    prev_state[0] = text
-
-#Recording Function for Head Movement Detection
-def Head_record_duration(text,img):
-    global start_time, end_time, recorded_durations, prev_state, flag,writer, width, height
-    print("Running HeadMovement Recording Function")
-    print(text)
-    if text != "Forward":
-        if str(text) != prev_state[1] and prev_state[1] == "Forward":
-            start_time[1] = time.time()
-            for _ in range(2):
-                writer[1].write(img)
-        elif str(text) != prev_state[1] and prev_state[1] != "Forward":
-            writer[1].release()
-            end_time[1] = time.time()
-            duration = math.ceil((end_time[1] - start_time[1])/7)
-            outputVideo = os.path.join(video_dir, 'HeadViolation' + os.path.basename(video[1]))
-            HeadViolation = {
-                "Name": prev_state[1],
-                "Time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start_time[1])),
-                "Duration": str(duration) + " seconds",
-                "Mark": duration,
-                "Link": outputVideo,
-                "RId": get_resultId()
-            }
-            if flag[1]:
-                recorded_durations.append(HeadViolation)
-                write_json(HeadViolation)
-                reduceBitRate(video[1], outputVideo)
-                move_file_to_output_folder(outputVideo)
-            os.remove(video[1])
-            print(recorded_durations)
-            start_time[1] = time.time()
-            video[1] = os.path.join(video_dir, str(random.randint(1, 50000)) + ".mp4")
-            writer[1] = cv2.VideoWriter(video[1], cv2.VideoWriter_fourcc(*'mp4v'), HEAD_MOVEMENT_FPS, (width,height))
-            flag[1] = False
-        elif str(text) == prev_state[1] and (time.time() - start_time[1]) > 3:
-            flag[1] = True
-            for _ in range(2):
-                writer[1].write(img)
-        elif str(text) == prev_state[1] and (time.time() - start_time[1]) <= 3:
-            flag[1] = False
-            for _ in range(2):
-                writer[1].write(img)
-        prev_state[1] = text
-    else:
-        if prev_state[1] != "Forward":
-            writer[1].release()
-            end_time[1] = time.time()
-            duration = math.ceil((end_time[1] - start_time[1])/7)
-            outputVideo = os.path.join(video_dir, 'HeadViolation' + os.path.basename(video[1]))
-            HeadViolation = {
-                "Name": prev_state[1],
-                "Time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start_time[1])),
-                "Duration": str(duration) + " seconds",
-                "Mark": duration,
-                "Link": outputVideo,
-                "RId": get_resultId()
-            }
-            if flag[1]:
-                recorded_durations.append(HeadViolation)
-                write_json(HeadViolation)
-                reduceBitRate(video[1], outputVideo)
-                move_file_to_output_folder(outputVideo)
-            os.remove(video[1])
-            print(recorded_durations)
-            video[1] = os.path.join(video_dir, str(random.randint(1, 50000)) + ".mp4")
-            writer[1] = cv2.VideoWriter(video[1], cv2.VideoWriter_fourcc(*'mp4v'), HEAD_MOVEMENT_FPS, (width,height))
-            flag[1] = False
-        prev_state[1] = text
-
-#Recording Function for More than one person Detection
-def MTOP_record_duration(text, img):
-    global start_time, end_time, recorded_durations, prev_state, flag, writer, width, height
-    print("Running MTOP Recording Function")
-    print(text)
-    if text != 'Only one person is detected' and prev_state[2] == 'Only one person is detected':
-        start_time[2] = time.time()
-        for _ in range(2):
-            writer[2].write(img)
-    elif text != 'Only one person is detected' and str(text) == prev_state[2] and (time.time() - start_time[2]) > 3:
-        flag[2] = True
-        for _ in range(2):
-            writer[2].write(img)
-    elif text != 'Only one person is detected' and str(text) == prev_state[2] and (time.time() - start_time[2]) <= 3:
-        flag[2] = False
-        for _ in range(2):
-            writer[2].write(img)
-    else:
-        if prev_state[2] != "Only one person is detected":
-            writer[2].release()
-            end_time[2] = time.time()
-            duration = math.ceil((end_time[2] - start_time[2])/3)
-            outputVideo = os.path.join(video_dir, 'MTOPViolation' + os.path.basename(video[2]))
-            MTOPViolation = {
-                "Name": prev_state[2],
-                "Time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start_time[2])),
-                "Duration": str(duration) + " seconds",
-                "Mark": math.floor(1.5 * duration),
-                "Link": outputVideo,
-                "RId": get_resultId()
-            }
-            if flag[2]:
-                recorded_durations.append(MTOPViolation)
-                write_json(MTOPViolation)
-                reduceBitRate(video[2], outputVideo)
-                move_file_to_output_folder(outputVideo)
-            os.remove(video[2])
-            print(recorded_durations)
-            video[2] = os.path.join(video_dir, str(random.randint(1, 50000)) + ".mp4")
-            writer[2] = cv2.VideoWriter(video[2], cv2.VideoWriter_fourcc(*'mp4v'), MTOP_DETECTION_FPS, (width,height))
-            flag[2] = False
-    prev_state[2] = text
-
-#Recording Function for Screen Detection
-def SD_record_duration(text, img):
-    global start_time, end_time, prev_state, flag, writer, width, height
-    print("Running SD Recording Function")
-    print(text)
-    if text != "Stay in the Test" and prev_state[3] == "Stay in the Test":
-        start_time[3] = time.time()
-        print(f"Start SD Recording, start time is {start_time[3]} and array is {start_time}")
-        for _ in range(2):
-            writer[3].write(img)
-    elif text != "Stay in the Test" and str(text) == prev_state[3] and (time.time() - start_time[3]) > 3:
-        flag[3] = True
-        for _ in range(2):
-            writer[3].write(img)
-    elif text != "Stay in the Test" and str(text) == prev_state[3] and (time.time() - start_time[3]) <= 3:
-        flag[3] = False
-        for _ in range(2):
-            writer[3].write(img)
-    else:
-        if prev_state[3] != "Stay in the Test":
-            writer[3].release()
-            end_time[3] = time.time()
-            duration = math.ceil((end_time[3] - start_time[3])/4)
-            outputVideo = os.path.join(video_dir, 'SDViolation' + os.path.basename(video[3]))
-            SDViolation = {
-                "Name": prev_state[3],
-                "Time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start_time[3])),
-                "Duration": str(duration) + " seconds",
-                "Mark": (2 * duration),
-                "Link": outputVideo,
-                "RId": get_resultId()
-            }
-            if flag[3]:
-                recorded_durations.append(SDViolation)
-                write_json(SDViolation)
-                reduceBitRate(video[3], outputVideo)
-                move_file_to_output_folder(outputVideo)
-            os.remove(video[3])
-            print(recorded_durations)
-            video[3] = os.path.join(video_dir, str(random.randint(1, 50000)) + ".mp4")
-            writer[3] = cv2.VideoWriter(video[3], cv2.VideoWriter_fourcc(*'mp4v'), SCREEN_DETECTION_FPS, (1920, 1080))
-            flag[3] = False
-    prev_state[3] = text
+class H264Writer:
+    """Used like cv2.VideoWriter, but encodes H.264 in-process with PyAV.
+
+    libx264 with VIDEO_PRESET at VIDEO_CRF, capped at VIDEO_MAX_BITRATE, and a keyframe
+    every VIDEO_KEYFRAME_SECS so the file can be cut by stream copy. Frames are numbered
+    on the fps grid (pts = frame index).
+    """
+
+    def __init__(self, path, fps, size):
+        self.path = path
+        self.container = av.open(path, 'w', container_options={'movflags': '+faststart'})
+        self.stream = self.container.add_stream(VIDEO_CODEC, rate=fps)
+        # yuv420p needs even dimensions, the encoder scales the frames to them
+        self.stream.width = size[0] - size[0] % 2
+        self.stream.height = size[1] - size[1] % 2
+        self.stream.pix_fmt = 'yuv420p'
+        self.stream.options = {
+            'preset': VIDEO_PRESET,
+            'crf': str(VIDEO_CRF),
+            'maxrate': VIDEO_MAX_BITRATE,
+            'bufsize': VIDEO_MAX_BITRATE,
+            'g': str(max(1, round(fps * VIDEO_KEYFRAME_SECS))),
+        }
+        self.frames = 0
+
+    def isOpened(self):
+        return self.container is not None
+
+    def write(self, img):
+        frame = av.VideoFrame.from_ndarray(np.ascontiguousarray(img), format='bgr24')
+        frame.pts = self.frames
+        self.frames += 1
+        for packet in self.stream.encode(frame):
+            self.container.mux(packet)
+
+    def release(self):
+        if self.container is None:
+            return
+        for packet in self.stream.encode():  # Flush the encoder
+            self.container.mux(packet)
+        self.container.close()
+        self.container = None
+
+#Function to open the encoder of one recording segment (H.264 with PyAV, mp4v with OpenCV without it)
+def open_video_writer(path, fps, size):
+    if load_pyav():
+        return H264Writer(path, fps, size)
+    return cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+
+class SegmentTrack:
+    """One source (camera or screen) encoded once, at its native size, in short segments.
+
+    Frames are written on a fixed `fps` grid that follows the wall clock (a frame is
+    repeated when the source is slower and skipped when it is faster), so a moment of the
+    exam maps directly to a position in the stream. A new segment is started every
+    SESSION_SEGMENT_SECS or when the frame size changes; closed segments can be cut by
+    stream copy. Segments older than SESSION_RETENTION_SECS are deleted unless a
+    violation still needs them (pins).
+    """
+
+    def __init__(self, name, fps):
+        self.name = name
+        self.fps = fps
+        self.lock = threading.Lock()
+        self.tag = ''
+        self.segments = []  # {"Path", "Start", "End"}, End is None while the segment is written
+        self.pins = {}  # Segment path -> violations still waiting to be cut from it
+        self.writer = None
+        self.shape = None
+        self.written = 0  # Frames in the open segment
+        self.last_time = 0  # Time of the last recorded frame
+        self.count = 0
+        self.frames = 0
+        self.repeated = 0
+
+    def open_segment(self, img, now):
+        self.count += 1
+        path = os.path.join(video_dir, f"session_{self.tag}_{self.name}_{self.count}.mp4")
+        self.writer = open_video_writer(path, self.fps, (img.shape[1], img.shape[0]))
+        self.shape = img.shape
+        self.written = 0
+        self.segments.append({"Path": path, "Start": now, "End": None})
+
+    def close_segment(self, now):
+        if self.writer is None:
+            return
+        self.writer.release()
+        self.writer = None
+        segment = self.segments[-1]
+        segment["End"] = segment["Start"] + self.written / self.fps
+        self.prune(now)
+
+    def write(self, img, now):
+        with self.lock:
+            if self.writer is not None and (img.shape != self.shape or
+                                            now - self.segments[-1]["Start"] >= SESSION_SEGMENT_SECS):
+                self.close_segment(now)
+            if self.writer is None:
+                self.open_segment(img, now)
+            due = math.floor((now - self.segments[-1]["Start"]) * self.fps + 1e-6) + 1
+            self.last_time = now
+            self.frames += 1
+            if self.written < due - 1:
+                self.repeated += due - 1 - self.written
+            while self.written < due:
+                self.writer.write(img)
+                self.written += 1
+
+    def cut(self, start, end):
+        """Closed segments covering [start, end], pinned until release()"""
+        with self.lock:
+            if self.writer is not None and self.segments[-1]["Start"] < end:
+                self.close_segment(self.last_time)
+            pieces = [dict(segment) for segment in self.segments
+                      if segment["End"] is not None and segment["End"] > start and segment["Start"] < end]
+            for piece in pieces:
+                self.pins[piece["Path"]] = self.pins.get(piece["Path"], 0) + 1
+            return pieces
+
+    def release(self, pieces):
+        with self.lock:
+            for piece in pieces:
+                self.pins[piece["Path"]] -= 1
+                if not self.pins[piece["Path"]]:
+                    del self.pins[piece["Path"]]
+            if self.writer is None:
+                self.prune(self.last_time)
+
+    def prune(self, now):
+        keep_from = now - SESSION_RETENTION_SECS
+        # An open episode may still become a violation that reaches back to its start
+        for episode in violation_episodes.values():
+            if episode.state is not None and getattr(episode.sink, 'source', None) == self.name:
+                keep_from = min(keep_from, episode.start)
+        kept = []
+        for segment in self.segments:
+            if segment["End"] is not None and segment["End"] < keep_from and segment["Path"] not in self.pins:
+                try:
+                    os.remove(segment["Path"])
+                except OSError:
+                    pass
+            else:
+                kept.append(segment)
+        self.segments = kept
+
+    def stop(self):
+        with self.lock:
+            self.close_segment(self.last_time)
+
+    def remove_segments(self):
+        """Delete every segment no violation is waiting for"""
+        with self.lock:
+            self.close_segment(self.last_time)
+            kept = []
+            for segment in self.segments:
+                if segment["Path"] in self.pins:
+                    kept.append(segment)
+                    continue
+                try:
+                    os.remove(segment["Path"])
+                except OSError:
+                    pass
+            self.segments = kept
+
+    def stats(self):
+        with self.lock:
+            return {"Segments": len(self.segments), "Frames": self.frames, "Repeated": self.repeated,
+                    "Pinned": len(self.pins), "Size": None if self.shape is None else [self.shape[1], self.shape[0]]}
+
+class SessionRecorder:
+    """The exam's recording: one SegmentTrack (one encoder) per source"""
+
+    def __init__(self):
+        self.tracks = {
+            'camera': SegmentTrack('camera', SESSION_CAMERA_FPS),
+            'screen': SegmentTrack('screen', SCREEN_DETECTION_FPS),
+        }
+        self.lock = threading.Lock()
+        self.running = False
+        self.tag = None  # Part of every segment name, unique to one exam session
+
+    def start(self):
+        with self.lock:
+            if self.running:
+                return
+            self.tag = time.strftime("%Y%m%d%H%M%S") + uuid.uuid4().hex[:8]
+            for track in self.tracks.values():
+                track.tag = self.tag
+            self.running = True
+
+    def record(self, source, img, now=None):
+        if not self.running or img is None:
+            return
+        self.tracks[source].write(img, time.time() if now is None else now)
+
+    def cut(self, source, start, end):
+        return self.tracks[source].cut(start, end)
+
+    def release(self, source, pieces):
+        self.tracks[source].release(pieces)
+
+    def stop(self):
+        with self.lock:
+            self.running = False
+        for track in self.tracks.values():
+            track.stop()
+
+    def remove_segments(self):
+        self.stop()
+        for track in self.tracks.values():
+            track.remove_segments()
+
+    def segment_files(self):
+        """Segment files that are not trash"""
+        files = set()
+        for track in self.tracks.values():
+            with track.lock:
+                files.update(os.path.basename(segment["Path"]) for segment in track.segments)
+        return files
+
+    def owns(self, filename):
+        """True if a segment file was recorded by this session"""
+        return self.tag is not None and filename.startswith(f"session_{self.tag}_")
+
+    def stats(self):
+        return {name: track.stats() for name, track in self.tracks.items()}
+
+session_recorder = SessionRecorder()
+
+#Violation episodes
+class ViolationSink:
+    """Where the evidence of a violation episode goes. This base sink keeps nothing."""
+
+    def link(self):
+        """Link stored in the violation entry"""
+        return ''
+
+    def write(self, img):
+        pass
+
+    def confirm(self):
+        """The episode has lasted long enough to count"""
+        pass
+
+    def finish(self, violation, start, end):
+        """The episode [start, end] ended, violation is its entry or None for a false alarm"""
+        pass
+
+class StreamSink(ViolationSink):
+    """Violation as a time range of a session recording track, cut out by the finalizer"""
+
+    def __init__(self, source, prefix):
+        self.source = source  # SessionRecorder track, 'camera' or 'screen'
+        self.prefix = prefix  # Output file name prefix, e.g. 'FDViolation'
+        self.output = None
+
+    def link(self):
+        if self.output is None:
+            self.output = os.path.join(video_dir, self.prefix + uuid.uuid4().hex + ".mp4")
+        return self.output
+
+    def finish(self, violation, start, end):
+        output, self.output = self.link(), None
+        if violation is None:
+            return
+        pieces = session_recorder.cut(self.source, start, end)
+        if not pieces:
+            print(f"No {self.source} recording covers the violation '{violation['Name']}', it is logged without a clip")
+            violation["Link"] = ""
+            write_json(violation)
+            return
+        # Cut and log in the background so detection keeps running
+        violation_finalizer.submit(output, violation,
+                                   prepare=lambda: extract_clip(pieces, start, end, output),
+                                   done=lambda: session_recorder.release(self.source, pieces))
+
+class JsonSink(ViolationSink):
+    """No evidence file, a confirmed violation is logged straight away"""
+
+    def finish(self, violation, start, end):
+        if violation is not None:
+            write_json(violation)
+
+class ViolationEpisode:
+    """Start/extend/finish logic of one detector's violations.
+
+    update() gets the detector's state on every run. A state other than `normal` opens
+    an episode once it has been seen `hysteresis` times in a row. The episode counts
+    (is confirmed) once it has lasted longer than `min_duration` seconds, and it ends
+    when the state has been back to normal for `debounce` seconds or changes to another
+    violation. Its duration is reported in units of `duration_scale` seconds and scored
+    `mark` per unit. Every update does a constant amount of work, and all evidence goes
+    through the sink, so the logic can be driven without a camera (pass `now`).
+    """
+
+    def __init__(self, normal, sink=None, min_duration=EPISODE_MIN_DURATION, hysteresis=EPISODE_HYSTERESIS,
+                 debounce=EPISODE_DEBOUNCE, duration_scale=1, mark=1):
+        self.normal = normal
+        self.sink = sink or ViolationSink()
+        self.min_duration = min_duration
+        self.hysteresis = hysteresis
+        self.debounce = debounce
+        self.duration_scale = duration_scale
+        self.mark = mark
+        self.lock = threading.Lock()
+        self.state = None  # Violation of the open episode
+        self.start = 0
+        self.rid = None  # Result id of the exam the episode opened in
+        self.confirmed = False
+        self.normal_since = None  # Start of a normal spell inside the episode (debounce)
+        self.candidate = None  # Violation seen before the episode opens (hysteresis)
+        self.candidate_count = 0
+        self.candidate_since = 0
+        self.episodes = 0
+        self.violations = 0
+
+    def update(self, state, img=None, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            if state == self.normal:
+                self.candidate = None
+                if self.state is None:
+                    return
+                if self.normal_since is None:
+                    self.normal_since = now
+                if now - self.normal_since >= self.debounce:
+                    self.finish(self.normal_since)
+                else:
+                    self.sink.write(img)
+                return
+
+            if self.state is not None and state != self.state:
+                self.finish(now)
+            if self.state is None:
+                if state != self.candidate:
+                    self.candidate = state
+                    self.candidate_count = 0
+                    self.candidate_since = now
+                self.candidate_count += 1
+                if self.candidate_count < self.hysteresis:
+                    return
+                self.state = state
+                self.start = self.candidate_since
+                # Taken now, the exam may have ended (and its id been cleared) by the time the episode is logged
+                self.rid = get_resultId()
+                self.candidate = None
+            self.normal_since = None
+            self.sink.write(img)
+            if not self.confirmed and now - self.start > self.min_duration:
+                self.confirmed = True
+                self.sink.confirm()
+
+    def finish(self, end):
+        duration = math.ceil((end - self.start) / self.duration_scale)
+        violation = {
+            "Name": self.state,
+            "Time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.start)),
+            "Duration": str(duration) + " seconds",
+            "Mark": math.floor(self.mark * duration),
+            "Link": self.sink.link(),
+            "RId": self.rid
+        }
+        self.episodes += 1
+        if self.confirmed:
+            self.violations += 1
+            recorded_durations.append(violation)
+            self.sink.finish(violation, self.start, end)
+        else:
+            self.sink.finish(None, self.start, end)
+        self.state = None
+        self.confirmed = False
+        self.normal_since = None
+
+    def close(self, now=None):
+        """The detector stopped (exam end): finish an open episode and forget the candidate"""
+        now = time.time() if now is None else now
+        with self.lock:
+            if self.state is not None:
+                # A normal spell that was still in its debounce ended the episode when it began
+                self.finish(self.normal_since if self.normal_since is not None else now)
+            self.candidate = None
+            self.candidate_count = 0
+
+    def stats(self):
+        return {"Episodes": self.episodes, "Violations": self.violations, "Open": self.state}
+
+# Durations were always reported in these (detector specific) units, the marks and trust scores depend on them
+face_episode = ViolationEpisode('Verified Student appeared', StreamSink('camera', 'FDViolation'),
+                                duration_scale=3, mark=2)
+head_episode = ViolationEpisode('Forward', StreamSink('camera', 'HeadViolation'),
+                                duration_scale=7, mark=1)
+mtop_episode = ViolationEpisode('Only one person is detected', StreamSink('camera', 'MTOPViolation'),
+                                duration_scale=3, mark=1.5)
+screen_episode = ViolationEpisode('Stay in the Test', StreamSink('screen', 'SDViolation'),
+                                  duration_scale=4, mark=2)
+device_episode = ViolationEpisode('No Electronic Device Detected', StreamSink('camera', 'EDViolation'),
+                                  duration_scale=1, mark=1.5)
+violation_episodes = {
+    'FaceVerification': face_episode,
+    'HeadMovement': head_episode,
+    'MTOP': mtop_episode,
+    'Screen': screen_episode,
+    'ElectronicDevice': device_episode,
+}
+
+def close_episodes():
+    """Finish every open episode under its own exam, before the session segments are removed"""
+    for episode in violation_episodes.values():
+        episode.close()
 
 # Function to capture the screen using PyAutoGUI and return the frame as a NumPy array
 def capture_screen():
@@ -446,77 +967,251 @@ def capture_screen():
     frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
     return frame
 
-#Recording Function for Electronic Devices Detection
-def EDD_record_duration(text, img):
-    global start_time, end_time, prev_state, flag, writer,recorded_Images,EDD_Duration, video, EDWidth, EDHeight
-    print(text)
-    if text == "Electronic Device Detected":
-        if prev_state[4] == "No Electronic Device Detected":
-            start_time[4] = time.time()
-            # Initialize frame counter for this detection event
-            EDD_record_duration.frame_count = 0
-        # Debug: Check frame shape and writer properties
-        print(f"[DEBUG] Frame shape: {img.shape}")
-        print(f"[DEBUG] Writer[4] is opened: {writer[4].isOpened()}")
-        print(f"[DEBUG] Writer[4] size: {EDWidth}x{EDHeight}")
-        # Ensure frame matches writer dimensions
-        if img.shape[1] != EDWidth or img.shape[0] != EDHeight:
-            print(f"[DEBUG] Resizing frame from {img.shape[1]}x{img.shape[0]} to {EDWidth}x{EDHeight}")
-            img = cv2.resize(img, (EDWidth, EDHeight))
-        writer[4].write(img)
-        # Increment and print frame counter
-        if not hasattr(EDD_record_duration, 'frame_count'):
-            EDD_record_duration.frame_count = 1
-        else:
-            EDD_record_duration.frame_count += 1
-        # If detected for more than 3 seconds, set flag
-        if (time.time() - start_time[4]) > 3:
-            flag[4] = True
-        else:
-            flag[4] = False
-    else:
-        # Detection ended, process video
-        if prev_state[4] == "Electronic Device Detected":
-            # Reset frame counter for next event
-            EDD_record_duration.frame_count = 0
-            writer[4].release()
-            end_time[4] = time.time()
-            duration = math.ceil(end_time[4] - start_time[4])
-            base_filename = os.path.basename(video[4])
-            outputVideo = os.path.join(video_dir, 'EDViolation' + base_filename)
-            EDViolation = {
-                "Name": prev_state[4],
-                "Time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start_time[4])),
-                "Duration": str(duration) + " seconds",
-                "Mark": math.floor(1.5 * duration),
-                "Link": os.path.relpath(outputVideo, start=os.getcwd()),
-                "RId": get_resultId()
-            }
-            if flag[4]:
-                try:
-                    file_size = os.path.getsize(video[4])
-                except Exception as e:
-                    print(f"Error checking file size for {video[4]}: {e}")
-                    file_size = 0
-                if file_size > 10240:
-                    write_json(EDViolation)
-                    reduceBitRate(video[4], outputVideo)
-                    move_file_to_output_folder(outputVideo)
-            os.remove(video[4])
-            video[4]= os.path.join(video_dir, str(random.randint(1, 50000)) + ".mp4")
-            writer[4] = cv2.VideoWriter(video[4], cv2.VideoWriter_fourcc(*'mp4v'), ELECTRONIC_DEVICE_FPS , (EDWidth,EDHeight))
-            flag[4] = False
-    prev_state[4] = text
-
 #system Related
+class CameraFrame:
+    """One published camera frame plus the preprocessed variants the detectors share.
+
+    Each variant is built once per frame, by whichever detector asks for it first,
+    and then reused by every other detector. Treat all of them as read-only.
+    """
+
+    def __init__(self, seq, image):
+        self.seq = seq
+        self.image = image  # Read-only BGR view into the frame ring
+        self.time = time.time()  # Publish time, the frame's position in the session recording
+        self.slot = None  # (ring generation, slot index), set by FrameRing.publish
+        self.cache = {}
+        self.lock = threading.Lock()
+
+    def variant(self, name, build):
+        value = self.cache.get(name)
+        if value is None:
+            with self.lock:
+                value = self.cache.get(name)
+                if value is None:
+                    value = build()
+                    self.cache[name] = value
+        return value
+
+    @property
+    def rgb(self):
+        """Full size RGB frame (MediaPipe)"""
+        return self.variant('rgb', lambda: cv2.cvtColor(self.image, cv2.COLOR_BGR2RGB))
+
+    @property
+    def small_rgb(self):
+        """Downsized RGB frame (face verification), resized before the colour swap"""
+        return self.variant('small_rgb', lambda: cv2.cvtColor(
+            cv2.resize(self.image, (0, 0), fx=SMALL_FRAME_SCALE, fy=SMALL_FRAME_SCALE), cv2.COLOR_BGR2RGB))
+
+    @property
+    def motion_gray(self):
+        """Tiny grayscale thumbnail for the motion score"""
+        return self.variant('motion_gray', lambda: cv2.cvtColor(
+            cv2.resize(self.image, MOTION_FRAME_SIZE, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY))
+
+    @property
+    def yolo_input(self):
+        """BGR frame shrunk to YOLO_INPUT_SIZE so YOLO's letterbox only has to pad it"""
+        def build():
+            img_h, img_w = self.image.shape[:2]
+            scale = YOLO_INPUT_SIZE / max(img_h, img_w)
+            if scale >= 1:
+                return np.ascontiguousarray(self.image)
+            return cv2.resize(self.image, (round(img_w * scale), round(img_h * scale)), interpolation=cv2.INTER_AREA)
+        return self.variant('yolo_input', build)
+
+    @property
+    def yolo_scale(self):
+        """Factor that maps box coordinates on yolo_input back to the full frame"""
+        return self.image.shape[1] / self.yolo_input.shape[1]
+
+class FrameRing:
+    """Preallocated ring of camera frame slots shared by every detector.
+
+    The producer captures straight into a free slot and stamps it with a
+    monotonically increasing sequence number. Consumers subscribe to the ring and
+    receive read-only views of a slot instead of their own copy, and only copy a
+    frame themselves when they need to draw on it.
+    A subscriber holds the frame it was given until it asks for the next one, and a
+    held slot is never captured into again. If every slot is held, the ring grows by
+    one slot, so a slow detector never sees a half-overwritten frame.
+    """
+
+    def __init__(self, size=FRAME_RING_SIZE):
+        self.size = size
+        self.slots = []
+        self.frames = []  # CameraFrame stored in each slot (None while it is being written)
+        self.holds = []  # Subscribers still reading each slot
+        self.generation = 0  # Bumped when the slots are reallocated (new resolution)
+        self.writing = None  # Slot the producer is capturing into
+        self.latest = None
+        self.latest_seq = -1
+        self.grown = 0
+        self.lock = threading.Lock()
+        self.new_frame = threading.Condition(self.lock)
+        self.subscribers = []
+
+    def reset(self):
+        """Forget the latest frame (sequence numbers keep increasing)"""
+        with self.lock:
+            self.latest = None
+
+    def free_slot(self):
+        """Reserve the oldest slot nobody holds (the lock must be held)"""
+        free = [idx for idx in range(len(self.slots))
+                if not self.holds[idx] and idx != self.writing and
+                (self.frames[idx] is None or self.frames[idx] is not self.latest)]
+        if not free:
+            self.slots.append(np.empty_like(self.slots[0]))
+            self.frames.append(None)
+            self.holds.append(0)
+            self.grown += 1
+            free = [len(self.slots) - 1]
+        idx = min(free, key=lambda i: -1 if self.frames[i] is None else self.frames[i].seq)
+        self.frames[idx] = None  # Invalidate the old frame before it gets overwritten
+        return idx
+
+    def next_slot(self):
+        """Buffer the producer should capture into next (None until the first frame)"""
+        with self.lock:
+            if not self.slots:
+                return None
+            self.writing = self.free_slot()
+            return self.slots[self.writing]
+
+    def publish(self, frame):
+        """Store a captured frame in a free slot, make it the latest one and wake the subscribers"""
+        with self.lock:
+            # (Re)allocate the slots on the first frame or when the resolution changes
+            if not self.slots or self.slots[0].shape != frame.shape or self.slots[0].dtype != frame.dtype:
+                self.slots = [np.empty_like(frame) for _ in range(self.size)]
+                self.frames = [None] * self.size
+                self.holds = [0] * self.size
+                self.generation += 1
+                self.writing = None
+            if self.writing is not None and frame is self.slots[self.writing]:
+                idx = self.writing
+            else:
+                self.writing = None
+                idx = self.free_slot()
+            self.writing = idx
+            slot = self.slots[idx]
+            generation = self.generation
+        if frame is not slot:
+            np.copyto(slot, frame)
+        with self.new_frame:
+            seq = self.latest_seq + 1
+            frame = CameraFrame(seq, slot.view())
+            frame.image.flags.writeable = False
+            frame.slot = (generation, idx)
+            if generation == self.generation:
+                self.frames[idx] = frame
+            self.writing = None
+            self.latest = frame
+            self.latest_seq = seq
+            self.new_frame.notify_all()
+        return seq
+
+    def acquire(self, seq):
+        """CameraFrame for frame `seq`, held until release() (None if its slot was already reused)"""
+        with self.lock:
+            frame = self.latest if self.latest is not None and self.latest.seq == seq else None
+            if frame is None:
+                frame = next((f for f in self.frames if f is not None and f.seq == seq), None)
+            if frame is not None and frame.slot[0] == self.generation:
+                self.holds[frame.slot[1]] += 1
+            return frame
+
+    def release(self, frame):
+        with self.lock:
+            generation, idx = frame.slot
+            if generation == self.generation and self.holds[idx] > 0:
+                self.holds[idx] -= 1
+
+    def copy(self, seq):
+        """Own copy of frame `seq` (None if its slot was already reused)"""
+        frame = self.acquire(seq)
+        if frame is None:
+            return None
+        try:
+            return frame.image.copy()
+        finally:
+            self.release(frame)
+
+    def wait_newer(self, last_seq, timeout=1.0):
+        """Block until a frame newer than `last_seq` is buffered, return its sequence number or None"""
+        with self.new_frame:
+            if not self.new_frame.wait_for(lambda: self._has_newer(last_seq), timeout):
+                return None
+            return self.latest_seq
+
+    def _has_newer(self, last_seq):
+        # reset() forgets the latest frame until the next publish
+        return self.latest is not None and self.latest.seq > last_seq
+
+    def subscribe(self, name):
+        """Register a consumer, each one keeps its own position and drop counter"""
+        subscriber = FrameSubscriber(self, name)
+        with self.lock:
+            replaced = [sub for sub in self.subscribers if sub.name == name]
+            self.subscribers = [sub for sub in self.subscribers if sub.name != name] + [subscriber]
+        for sub in replaced:
+            sub.release()  # A previous exam's detector may still hold a frame
+        return subscriber
+
+    def stats(self):
+        """Delivered/dropped frame counters for every subscriber"""
+        with self.lock:
+            subscribers = list(self.subscribers)
+        return {sub.name: {"Received": sub.received, "Dropped": sub.dropped, "LastFrame": sub.last_seq}
+                for sub in subscribers}
+
+class FrameSubscriber:
+    """One detector's position in the frame ring"""
+
+    def __init__(self, ring, name):
+        self.ring = ring
+        self.name = name
+        self.last_seq = -1
+        self.frame = None  # Frame held for the detector until it asks for the next one
+        self.received = 0
+        self.dropped = 0
+
+    def next(self, timeout=1.0):
+        """Wait for a frame this subscriber has not seen yet, returns (seq, CameraFrame) or (None, None).
+
+        The frame stays valid until the next call (or release()), keep a copy to use it longer.
+        """
+        self.release()
+        seq = self.ring.wait_newer(self.last_seq, timeout)
+        frame = self.ring.acquire(seq) if seq is not None else None
+        if frame is None:
+            return None, None
+        # Frames published while we were busy with the previous one are skipped
+        if self.last_seq >= 0:
+            self.dropped += seq - self.last_seq - 1
+        self.last_seq = seq
+        self.frame = frame
+        self.received += 1
+        return seq, frame
+
+    def release(self):
+        frame, self.frame = self.frame, None
+        if frame is not None:
+            self.ring.release(frame)
+
+frame_ring = FrameRing()
+
 def camera_producer_thread():
-    """Double-buffered camera producer thread for optimal performance"""
-    global Globalflag, cap, write_frame, read_frame, frame_lock, frame_ready
-    print("Camera producer thread started (double buffering)")
+    """Camera producer thread that captures into the shared frame ring"""
+    global Globalflag, cap, frame_ring
+    print("Camera producer thread started (frame ring)")
     
     last_frame_time = 0
     target_fps = 20  # Limit camera FPS to prevent overwhelming
     frame_interval = 1.0 / target_fps
+    frame_ring.reset()
     
     while Globalflag:
         current_time = time.time()
@@ -524,48 +1219,293 @@ def camera_producer_thread():
         # Rate limiting: only capture at target FPS
         if current_time - last_frame_time >= frame_interval:
             if cap is not None and cap.isOpened():
-                success, frame = cap.read()
+                # Decode directly into the next ring slot once it has been allocated
+                slot = frame_ring.next_slot()
+                success, frame = cap.read(slot) if slot is not None else cap.read()
                 if success and frame is not None and frame.size > 0:
-                    # Write to write_frame (no lock needed - producer only)
-                    write_frame = frame.copy()
-                    
-                    # Quick buffer swap (minimal lock time)
-                    with frame_lock:
-                        read_frame = write_frame
-                    
-                    frame_ready.set()  # Signal that new frame is available
+                    frame_ring.publish(frame)  # Wakes up the subscribed detectors
                     last_frame_time = current_time
             else:
                 time.sleep(0.01)  # Small delay if camera not available
         else:
             time.sleep(0.001)  # Small sleep to prevent busy waiting
     
-    print("Camera producer thread stopped")
+    print(f"Camera producer thread stopped, frame delivery: {frame_ring.stats()}")
 
 def get_camera_frame(timeout=1.0):
-    """Get current frame using double buffering (thread-safe but minimal locking)"""
-    global read_frame, frame_lock, frame_ready
-    
-    # Wait for frame to be ready with timeout
-    if frame_ready.wait(timeout):
-        # Quick lock to copy the frame reference (very fast)
-        with frame_lock:
-            if read_frame is not None:
-                frame_copy = read_frame.copy()  # Each thread gets its own copy
-                return frame_copy
-    return None
+    """Get a copy of the latest frame"""
+    global frame_ring
+    seq = frame_ring.wait_newer(-1, timeout)
+    return frame_ring.copy(seq) if seq is not None else None
+
+class PreviewService:
+    """MJPEG live preview of the camera, with the detected faces boxed (face input page).
+
+    One capture thread reads the camera and, at most PREVIEW_FPS times a second, finds
+    the faces on a small grayscale copy with a cascade loaded once, draws the boxes and
+    JPEG-encodes the frame once. Every connected viewer gets the same bytes. The thread
+    backs off after a failed read instead of spinning, and it releases the camera once
+    the last viewer has gone or stop() is called.
+    """
+
+    def __init__(self, fps=PREVIEW_FPS, quality=PREVIEW_JPEG_QUALITY, detect_width=PREVIEW_DETECT_WIDTH):
+        self.fps = fps
+        self.quality = quality
+        self.detect_width = detect_width
+        self.detector = None
+        self.lock = threading.Lock()
+        self.new_part = threading.Condition(self.lock)
+        self.thread = None
+        self.running = False
+        self.viewers = 0
+        self.part = None  # Latest multipart chunk (boundary, headers and JPEG)
+        self.seq = 0
+        self.frames = 0
+        self.failed_reads = 0
+        self.process_time = 0.0
+
+    def start(self):
+        with self.lock:
+            if self.running:
+                return
+            self.running = True
+            previous = self.thread
+        if previous is not None:
+            previous.join(timeout=5)  # Let the previous thread release the camera first
+        thread = threading.Thread(target=self.capture, name='PreviewService', daemon=True)
+        with self.lock:
+            self.thread = thread
+        thread.start()
+
+    def stop(self):
+        """Stop the capture thread and wait until it has released the camera"""
+        with self.lock:
+            self.running = False
+            thread = self.thread
+            self.new_part.notify_all()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=5)
+
+    def stream(self):
+        """Generator of multipart/x-mixed-replace chunks for one viewer"""
+        with self.lock:
+            self.viewers += 1
+        self.start()
+        try:
+            seq = self.seq
+            while True:
+                with self.new_part:
+                    self.new_part.wait_for(lambda: self.seq != seq or not self.running, timeout=1.0)
+                    if not self.running:
+                        break
+                    if self.seq == seq:
+                        continue
+                    seq, part = self.seq, self.part
+                yield part
+        finally:
+            with self.lock:
+                self.viewers -= 1
+
+    def boxes(self, frame):
+        """Face boxes (full frame coordinates), found on a grayscale copy detect_width pixels wide"""
+        if self.detector is None:
+            self.detector = cv2.CascadeClassifier(PREVIEW_CASCADE)
+            if self.detector.empty():
+                print(f"Could not load {PREVIEW_CASCADE}, the preview shows no face boxes")
+        if self.detector.empty():
+            return []
+        scale = min(1.0, self.detect_width / frame.shape[1])
+        small = frame if scale == 1.0 else cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        faces = self.detector.detectMultiScale(gray, 1.2, 6)
+        return [tuple(round(v / scale) for v in face) for face in faces]
+
+    def capture(self):
+        capture = cv2.VideoCapture(0, cv2.CAP_DSHOW)
+        interval = 1.0 / self.fps
+        next_time = time.time()
+        try:
+            while True:
+                with self.lock:
+                    if not self.running or not self.viewers:
+                        self.running = False
+                        self.new_part.notify_all()
+                        break
+                # Frames between two preview frames are only grabbed, not decoded
+                if not capture.grab():
+                    self.failed_reads += 1
+                    time.sleep(PREVIEW_RETRY_SECS)
+                    continue
+                now = time.time()
+                if now < next_time:
+                    continue
+                next_time = max(next_time + interval, now)
+                success, frame = capture.retrieve()
+                if not success or frame is None or frame.size == 0:
+                    self.failed_reads += 1
+                    time.sleep(PREVIEW_RETRY_SECS)
+                    continue
+                start = time.perf_counter()
+                for (x, y, w, h) in self.boxes(frame):
+                    cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 3)
+                success, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+                if not success:
+                    continue
+                part = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg.tobytes() + b'\r\n'
+                self.process_time += time.perf_counter() - start
+                with self.new_part:
+                    self.part = part
+                    self.seq += 1
+                    self.frames += 1
+                    self.new_part.notify_all()
+        except Exception as e:
+            print(f"Preview capture error: {e}")
+            with self.lock:
+                self.running = False
+                self.new_part.notify_all()
+        finally:
+            capture.release()
+
+    def stats(self):
+        return {"Viewers": self.viewers, "Frames": self.frames, "FailedReads": self.failed_reads,
+                "ProcessMs": round(self.process_time / self.frames * 1000, 2) if self.frames else 0}
+
+preview = PreviewService()
+
+class DetectorSchedule:
+    """Runs every detector at its own target rate instead of flat out.
+
+    A detector calls wait() before grabbing a frame and ran() after processing it.
+    The frame-difference motion score since the detector's previous run moves its
+    rate between MOTION_SLOW_FACTOR and MOTION_FAST_FACTOR times the target rate.
+    """
+
+    def __init__(self, rates=DETECTOR_RATES):
+        self.rates = dict(rates)
+        self.lock = threading.Lock()
+        self.state = {}
+
+    def detector(self, name):
+        with self.lock:
+            if name not in self.state:
+                self.state[name] = {"Rate": self.rates.get(name, 1), "Motion": 0.0, "EffectiveRate": 0.0,
+                                    "Runs": 0, "AvgRunTime": 0.0, "NextRun": 0.0, "LastRun": 0.0,
+                                    "Started": 0.0, "Thumbnail": None}
+            return self.state[name]
+
+    def wait(self, name):
+        """Sleep until the detector is due again (returns early when the exam stops)"""
+        state = self.detector(name)
+        while Globalflag:
+            remaining = state["NextRun"] - time.time()
+            if remaining <= 0:
+                break
+            time.sleep(min(remaining, 0.1))
+        state["Started"] = time.time()
+
+    def ran(self, name, frame=None):
+        """Record a finished run, update the motion score and schedule the next run"""
+        state = self.detector(name)
+        now = time.time()
+        rate = self.rates.get(name, 1)
+        if frame is not None:
+            thumbnail = frame.motion_gray
+            if state["Thumbnail"] is not None and state["Thumbnail"].shape == thumbnail.shape:
+                state["Motion"] = float(cv2.absdiff(thumbnail, state["Thumbnail"]).mean())
+                # Linear between the slow and fast factor as the motion goes from low to high
+                t = min(max((state["Motion"] - MOTION_LOW) / (MOTION_HIGH - MOTION_LOW), 0.0), 1.0)
+                rate *= MOTION_SLOW_FACTOR + t * (MOTION_FAST_FACTOR - MOTION_SLOW_FACTOR)
+            state["Thumbnail"] = thumbnail
+        if state["LastRun"]:
+            # Smoothed measured rate
+            measured = 1.0 / max(now - state["LastRun"], 1e-6)
+            state["EffectiveRate"] = 0.8 * state["EffectiveRate"] + 0.2 * measured if state["Runs"] > 1 else measured
+        run_time = now - state["Started"] if state["Started"] else 0.0
+        state["AvgRunTime"] = (state["AvgRunTime"] * state["Runs"] + run_time) / (state["Runs"] + 1)
+        state["Runs"] += 1
+        state["Rate"] = rate
+        state["LastRun"] = now
+        state["NextRun"] = state["Started"] + 1.0 / rate if state["Started"] else now + 1.0 / rate
+
+    def stats(self):
+        """Target, current and measured rate of every detector"""
+        with self.lock:
+            items = list(self.state.items())
+        return {name: {"TargetRate": self.rates.get(name, 1),
+                       "ScheduledRate": round(state["Rate"], 2),
+                       "EffectiveRate": round(state["EffectiveRate"], 2),
+                       "Motion": round(state["Motion"], 2),
+                       "Runs": state["Runs"],
+                       "AvgRunTime": round(state["AvgRunTime"], 4)}
+                for name, state in items}
+
+detector_schedule = DetectorSchedule()
+
+class FaceAnalysis:
+    """Faces found on one camera frame: FaceMesh landmarks, pixel boxes (x, y, w, h) and count"""
+
+    def __init__(self, seq, landmarks, boxes):
+        self.seq = seq
+        self.landmarks = landmarks  # MediaPipe NormalizedLandmarkList of each face (unflipped frame)
+        self.boxes = boxes
+        self.count = len(boxes)
+        # The largest face is taken to be the student's
+        self.primary = max(range(self.count), key=lambda i: boxes[i][2] * boxes[i][3]) if boxes else None
+
+class FaceAnalyzer:
+    """Runs FaceMesh once per camera tick for every face check.
+
+    MTOP, head movement and face verification each pick the latest frame when they are
+    scheduled. If a frame is within FACE_ANALYSIS_MAX_LAG frames of the last analysed one,
+    that analysis is returned instead of running FaceMesh again, so the three checks share
+    one detector pass instead of running three different ones.
+    """
+
+    def __init__(self):
+        self.face_mesh = mp.solutions.face_mesh.FaceMesh(max_num_faces=FACE_MESH_MAX_FACES,
+                                                         min_detection_confidence=FACE_MESH_CONFIDENCE,
+                                                         min_tracking_confidence=FACE_MESH_CONFIDENCE)
+        self.lock = threading.Lock()
+        self.latest = None
+        self.runs = 0
+        self.reused = 0
+
+    def analyze(self, frame):
+        with self.lock:
+            latest = self.latest
+            if latest is not None and abs(frame.seq - latest.seq) <= FACE_ANALYSIS_MAX_LAG:
+                self.reused += 1
+                return latest
+            results = self.face_mesh.process(frame.rgb)
+            img_h, img_w = frame.image.shape[:2]
+            landmarks = list(results.multi_face_landmarks or [])
+            boxes = []
+            for face_landmarks in landmarks:
+                points = np.array([(lm.x, lm.y) for lm in face_landmarks.landmark])
+                left, top = np.clip(points.min(axis=0) * (img_w, img_h), 0, None).astype(int)
+                right, bottom = np.minimum(points.max(axis=0) * (img_w, img_h), (img_w, img_h)).astype(int)
+                boxes.append((int(left), int(top), int(right - left), int(bottom - top)))
+            self.latest = FaceAnalysis(frame.seq, landmarks, boxes)
+            self.runs += 1
+            return self.latest
+
+    def stats(self):
+        return {"Runs": self.runs, "Reused": self.reused}
+
+def get_metrics():
+    """Detector schedule and frame delivery metrics"""
+    return {
+        "Detectors": detector_schedule.stats(),
+        "Frames": frame_ring.stats(),
+        "Finalization": violation_finalizer.stats(),
+        "FaceTracking": face_recognizer.tracking_stats() if face_recognizer is not None else {},
+        "FaceAnalysis": face_analyzer.stats() if face_analyzer is not None else {},
+        "Episodes": {name: episode.stats() for name, episode in violation_episodes.items()},
+        "Recording": session_recorder.stats(),
+        "Preview": preview.stats(),
+    }
 
 def deleteTrashVideos():
-    global video, writer
-    
-    # First, safely release any active video writers to unlock files
-    try:
-        for i, vid_writer in enumerate(writer):
-            if vid_writer is not None:
-                vid_writer.release()
-    except Exception as e:
-        pass
-    
     # Check both root directory and OutputVideos directory for temp files
     directories_to_check = [
         os.getcwd(),  # Current directory (root of project)
@@ -573,7 +1513,9 @@ def deleteTrashVideos():
     ]
     
     deleted_count = 0
-    current_video_files = [os.path.basename(v) for v in video if v]  # Get current active video filenames
+    current_video_files = list(session_recorder.segment_files())  # Segments of the exam recording
+    # Clips still waiting for the finalization queue are not trash either
+    current_video_files += [os.path.basename(v) for v in violation_finalizer.pending_outputs()]
     
     for directory in directories_to_check:
         if not os.path.exists(directory):
@@ -606,6 +1548,18 @@ def deleteTrashVideos():
                             deleted_count += 1
                     except OSError as e:
                         pass
+                # Segments this session no longer needs, or left over from an exam that ended long ago
+                # (another session may still be writing its own, recent segments)
+                elif (filename.startswith('session_') and
+                      filename not in current_video_files):
+                    try:
+                        if (not session_recorder.owns(filename) and
+                                time.time() - os.path.getmtime(file_path) < SESSION_RETENTION_SECS):
+                            continue
+                        os.remove(file_path)
+                        deleted_count += 1
+                    except OSError as e:
+                        pass
             
             # For WAV files: delete temporary voice violation files in root directory  
             elif (filename.lower().endswith('.wav') and 
@@ -616,61 +1570,23 @@ def deleteTrashVideos():
                     deleted_count += 1
                 except OSError as e:
                     pass
-    
-    # Reinitialize video writers after cleanup
-    reinitialize_video_writers()
-
-def reinitialize_video_writers():
-    """Reinitialize video writers after cleanup"""
-    global video, writer, video_dir, width, height, EDWidth, EDHeight
-    
-    try:
-        # Create new video file paths
-        video = [
-            os.path.join(video_dir, str(random.randint(1,50000))+".mp4"),
-            os.path.join(video_dir, str(random.randint(1,50000))+".mp4"),
-            os.path.join(video_dir, str(random.randint(1,50000))+".mp4"),
-            os.path.join(video_dir, str(random.randint(1,50000))+".mp4"),
-            os.path.join(video_dir, str(random.randint(1,50000))+".mp4")
-        ]
-        
-        # Create new video writers
-        writer = [
-            cv2.VideoWriter(video[0], cv2.VideoWriter_fourcc(*'mp4v'), FACE_DETECTION_FPS, (width,height)), 
-            cv2.VideoWriter(video[1], cv2.VideoWriter_fourcc(*'mp4v'), HEAD_MOVEMENT_FPS, (width,height)), 
-            cv2.VideoWriter(video[2], cv2.VideoWriter_fourcc(*'mp4v'), MTOP_DETECTION_FPS, (width,height)), 
-            cv2.VideoWriter(video[3], cv2.VideoWriter_fourcc(*'mp4v'), SCREEN_DETECTION_FPS, (1920, 1080)), 
-            cv2.VideoWriter(video[4], cv2.VideoWriter_fourcc(*'mp4v'), ELECTRONIC_DEVICE_FPS, (EDWidth,EDHeight))
-        ]
-        
-    except Exception as e:
-        pass
 
 def cleanup_all_videos():
-    """Complete cleanup function for application shutdown - releases all writers and cleans temp files"""
-    global video, writer, Globalflag
+    """Complete cleanup function for application shutdown - stops the recording and cleans temp files"""
+    global Globalflag
     
     print("Starting complete video cleanup...")
     
     # Stop all detection processes
     Globalflag = False
     
-    # Release all video writers and remove temp files
+    # Stop the session recording and remove its segments
     try:
-        for i, vid_writer in enumerate(writer):
-            if vid_writer is not None:
-                vid_writer.release()
-                print(f"Released video writer {i}")
-                
-                # Remove the temp file after releasing writer
-                if i < len(video) and video[i] and os.path.exists(video[i]):
-                    try:
-                        os.remove(video[i])
-                        print(f"Removed temp file: {video[i]}")
-                    except OSError as e:
-                        print(f"Could not remove {video[i]}: {e}")
+        close_episodes()
+        session_recorder.remove_segments()
+        print("Stopped the session recording")
     except Exception as e:
-        print(f"Error during writer cleanup: {e}")
+        print(f"Error during recording cleanup: {e}")
     
     # Now clean any remaining temp files
     deleteTrashVideos()
@@ -689,210 +1605,461 @@ def face_confidence(face_distance, face_match_threshold=0.6):
         value = (linear_val + ((1.0 - linear_val) * math.pow((linear_val - 0.5) * 2, 0.2))) * 100
         return str(round(value, 2)) + '%'
 
+def create_face_tracker(kind=FACE_TRACKER):
+    """New OpenCV tracker of the given kind (MIL if that one is not built in), None if there is none"""
+    for name in (kind, 'MIL'):
+        for module in (cv2, getattr(cv2, 'legacy', None)):
+            factory = getattr(module, f'Tracker{name}_create', None)
+            if factory is not None:
+                return factory()
+    return None
+
+def box_iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    width = min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0])
+    height = min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    return intersection / (a[2] * a[3] + b[2] * b[3] - intersection)
+
 class FaceRecognition:
-    face_locations = []
-    face_encodings = []
-    face_names = []
-    known_face_encodings = []
-    known_face_names = []
-    process_current_frame = True
+    """Face verification of the student against the encoded profile images.
+
+    Profile encodings are kept in FACE_ENCODING_CACHE (one matrix plus the file name,
+    mtime and content hash of each row), so dlib only runs on profiles that are new or
+    changed since the last run. Images without a face are cached too, with an empty row.
+
+    Each frame is only compared with the profiles of the logged-in student (Student_Name),
+    so its cost does not depend on how many students are enrolled. FACE_IMPOSTOR_CHECK
+    (on by default) rejects a face that is closer to another enrolled student. When the
+    student is selected, the other profiles are sorted by distance to each of the
+    student's profiles; a face at distance d from its nearest own profile can only be
+    closer to the profiles within 2d of it (triangle inequality), so only those few are
+    compared, and only for faces that would otherwise be verified.
+
+    With FACE_TRACKING, a verified face is followed by a cheap OpenCV tracker and only
+    detected/encoded again every FACE_REVERIFY_SECS, when its box jumps or when the
+    tracker loses it. tracking_stats() reports how often verification ran and how far the
+    tracked box had drifted from the face found by the next verification.
+    """
 
     def __init__(self):
+        load_libraries()
+        self.face_locations = []
+        self.face_encodings = []
+        self.face_names = []
+        self.known_face_encodings = np.empty((0, 128))
+        self.known_face_names = []
+        self.known_face_students = np.empty(0, dtype=str)  # Student name of each known face
+        self.known_face_norms = np.empty(0)  # Squared norm of each known encoding
+        self.student_name = None
+        # Student's encodings, other students' encodings, and the others sorted by distance to each student row
+        self.student_index = (np.empty((0, 128)), np.empty((0, 128)), np.empty((0, 0)), np.empty((0, 0), dtype=int))
+        self.cache = {}  # file name -> (mtime, hash, encoding or None)
+        self.lock = threading.Lock()
+        self.reset_tracking()
         self.encode_faces()
 
+    @staticmethod
+    def file_hash(path):
+        with open(path, 'rb') as file:
+            return hashlib.sha1(file.read()).hexdigest()
+
+    @staticmethod
+    def encode_image(path):
+        """128-d encoding of the first face in an image, None if no face was found"""
+        face_image = face_recognition.load_image_file(path)
+        face_encodings = face_recognition.face_encodings(face_image)
+        return face_encodings[0] if face_encodings else None
+
+    def load_cache(self):
+        """Read the whole encoding cache in one go"""
+        try:
+            with np.load(FACE_ENCODING_CACHE) as data:
+                names, mtimes, hashes = data['names'], data['mtimes'], data['hashes']
+                encodings, has_face = data['encodings'], data['has_face']
+        except (FileNotFoundError, OSError, KeyError, ValueError) as e:
+            if os.path.exists(FACE_ENCODING_CACHE):
+                print(f"Ignoring unreadable face encoding cache: {e}")
+            return {}
+        return {str(name): (float(mtime), str(digest), encoding if found else None)
+                for name, mtime, digest, encoding, found in zip(names, mtimes, hashes, encodings, has_face)}
+
+    def save_cache(self):
+        """Write the cache to a temp file and swap it in, so it is never half-written"""
+        names = sorted(self.cache)
+        entries = [self.cache[name] for name in names]
+        temp_path = FACE_ENCODING_CACHE + '.tmp'
+        with open(temp_path, 'wb') as file:
+            np.savez(file,
+                     names=np.array(names, dtype=str),
+                     mtimes=np.array([mtime for mtime, _, _ in entries], dtype=np.float64),
+                     hashes=np.array([digest for _, digest, _ in entries], dtype=str),
+                     encodings=np.array([encoding if encoding is not None else np.zeros(128)
+                                         for _, _, encoding in entries], dtype=np.float64).reshape(-1, 128),
+                     has_face=np.array([encoding is not None for _, _, encoding in entries], dtype=bool))
+        os.replace(temp_path, FACE_ENCODING_CACHE)
+
+    def cached_encoding(self, image, cache):
+        """(mtime, hash, encoding) of a profile, reusing the cache entry while the file is unchanged"""
+        path = os.path.join(PROFILES_DIR, image)
+        mtime = os.path.getmtime(path)
+        entry = cache.get(image)
+        if entry is not None and entry[0] == mtime:
+            return entry, False
+        digest = self.file_hash(path)
+        if entry is not None and entry[1] == digest:
+            return (mtime, digest, entry[2]), True  # Touched but not changed
+        encoding = self.encode_image(path)
+        if encoding is None:
+            print(f"No face found in {image}")
+        return (mtime, digest, encoding), True
+
+    def update_known_faces(self):
+        names = [name for name in sorted(self.cache) if self.cache[name][2] is not None]
+        self.known_face_names = names
+        self.known_face_encodings = np.array([self.cache[name][2] for name in names]).reshape(-1, 128)
+        self.known_face_students = np.array([name.split('_')[0] for name in names], dtype=str)
+        self.known_face_norms = np.einsum('ij,ij->i', self.known_face_encodings, self.known_face_encodings)
+        self.select_student(self.student_name)
+
+    def select_student(self, name):
+        """Keep the encodings of the student taking the exam, and the impostor index, for the per-frame check"""
+        own = self.known_face_students == name
+        others = ~own
+        # The student's profiles against all others in one matrix product: |a - b|^2 = |a|^2 + |b|^2 - 2ab
+        squared = (self.known_face_norms[own][:, None] + self.known_face_norms[others][None, :]
+                   - 2 * self.known_face_encodings[own] @ self.known_face_encodings[others].T)
+        order = np.argsort(squared, axis=1)
+        self.student_name = name
+        # Swapped in as one tuple, so a frame being verified never mixes two students
+        self.student_index = (self.known_face_encodings[own], self.known_face_encodings[others],
+                              np.sqrt(np.maximum(np.take_along_axis(squared, order, axis=1), 0)), order)
+
+    @staticmethod
+    def impostor_distance(index, face, own_distances):
+        """Distance from a face to the nearest profile of another student, if that is closer than the student's"""
+        student_encodings, other_encodings, sorted_distances, order = index
+        nearest = own_distances.argmin()
+        distance = own_distances[nearest]
+        # Profiles further than 2 * distance from the nearest own profile are further from the face than it
+        count = np.searchsorted(sorted_distances[nearest], 2 * distance)
+        if not count:
+            return np.inf
+        return np.linalg.norm(other_encodings[order[nearest, :count]] - face, axis=1).min()
+
+    def verify_faces(self, face_encodings):
+        """Label each face with the student's name and confidence, or Unknown"""
+        if self.student_name != Student_Name:
+            with self.lock:
+                self.select_student(Student_Name)
+        if not face_encodings:
+            return []
+        faces = np.asarray(face_encodings)
+        index = self.student_index
+        student_encodings = index[0]
+        if len(student_encodings):
+            own_distances = np.linalg.norm(faces[:, None, :] - student_encodings[None, :, :], axis=2)
+            distances = own_distances.min(axis=1)
+        else:
+            distances = np.full(len(faces), np.inf)
+
+        face_names = []
+        for i, distance in enumerate(distances):
+            name = "Unknown"
+            confidence = '???'
+            if distance <= FACE_MATCH_TOLERANCE:
+                tempconfidence = face_confidence(distance)
+                # Not the student if another enrolled student's profile is closer
+                if (float(tempconfidence[:-1]) >= FACE_MIN_CONFIDENCE and
+                        (not FACE_IMPOSTOR_CHECK or distance <= self.impostor_distance(index, faces[i], own_distances[i]))):
+                    name = self.student_name
+                    confidence = tempconfidence
+            face_names.append(f'{name} ({confidence})')
+        return face_names
+
     def encode_faces(self):
-        # Only process image files (jpg, jpeg, png)
-        valid_extensions = ('.jpg', '.jpeg', '.png', '.bmp', '.gif')
-        for image in os.listdir('static/Profiles'):
-            if image.lower().endswith(valid_extensions):
+        """Sync the encodings with static/Profiles, only encoding new or changed images"""
+        with self.lock:
+            cache = self.load_cache()
+            images = [image for image in os.listdir(PROFILES_DIR) if image.lower().endswith(PROFILE_EXTENSIONS)]
+            self.cache = {}
+            changed = False
+            for image in images:
                 try:
-                    face_image = face_recognition.load_image_file(f"static/Profiles/{image}")
-                    face_encodings = face_recognition.face_encodings(face_image)
-                    if face_encodings:  # Check if any faces were found
-                        face_encoding = face_encodings[0]
-                        self.known_face_encodings.append(face_encoding)
-                        self.known_face_names.append(image)
-                    else:
-                        print(f"No face found in {image}")
+                    self.cache[image], updated = self.cached_encoding(image, cache)
+                    changed = changed or updated
                 except Exception as e:
                     print(f"Error processing {image}: {e}")
-        print(f"Loaded {len(self.known_face_names)} face profiles: {self.known_face_names}")
+            if changed or set(cache) != set(self.cache):
+                self.save_cache()
+            self.update_known_faces()
+        print(f"Loaded {len(self.known_face_names)} face profiles")
+
+    def add_profile(self, image):
+        """Encode one new or replaced profile image and add it to the cache"""
+        with self.lock:
+            try:
+                self.cache[image], updated = self.cached_encoding(image, self.cache)
+            except Exception as e:
+                print(f"Error processing {image}: {e}")
+                return False
+            if updated:
+                self.save_cache()
+            self.update_known_faces()
+        return self.cache[image][2] is not None
+
+    def reset_tracking(self):
+        self.tracker = None
+        self.tracked_box = None  # (x, y, w, h) on the small frame
+        self.tracked_name = None
+        self.verified_at = 0
+        self.last_tracked_box = None  # Box the tracker had when it was dropped, for the drift metric
+        self.frames = 0
+        self.verifications = 0
+        self.tracked_frames = 0
+        self.reverify = {"Timer": 0, "Jump": 0, "Lost": 0}
+        self.drift_total = 0.0
+        self.drift_count = 0
+        self.last_drift = None
+
+    def track(self, frame):
+        """Follow the verified face on a new frame, False if it has to be verified again"""
+        if self.tracker is None:
+            return False
+        if time.time() - self.verified_at > FACE_REVERIFY_SECS:
+            reason = "Timer"
+        else:
+            success, box = self.tracker.update(frame.small_rgb)
+            if not success:
+                reason = "Lost"
+            else:
+                x, y, w, h = box
+                px, py, pw, ph = self.tracked_box
+                moved = math.hypot(x + w / 2 - px - pw / 2, y + h / 2 - py - ph / 2)
+                if moved <= FACE_BOX_JUMP * max(pw, 1):
+                    self.tracked_box = box
+                    self.tracked_frames += 1
+                    return True
+                reason = "Jump"
+        self.reverify[reason] += 1
+        self.last_tracked_box = self.tracked_box
+        self.tracker = None
+        return False
+
+    def start_tracking(self, frame):
+        """Start following the face that was just verified (only when exactly one face is the student)"""
+        verified = [(location, name) for location, name in zip(self.face_locations, self.face_names)
+                    if "Unknown" not in name]
+        if len(verified) != 1:
+            self.last_tracked_box = None
+            return
+        (top, right, bottom, left), name = verified[0]
+        box = (left, top, right - left, bottom - top)
+        if self.last_tracked_box is not None:
+            # Drift: how far the tracked box was from where the face really was
+            self.last_drift = 1 - box_iou(self.last_tracked_box, box)
+            self.drift_total += self.last_drift
+            self.drift_count += 1
+            self.last_tracked_box = None
+        if not FACE_TRACKING or box[2] <= 0 or box[3] <= 0:
+            return
+        tracker = create_face_tracker()
+        if tracker is None:
+            return
+        tracker.init(frame.small_rgb, box)
+        self.tracker = tracker
+        self.tracked_box = box
+        self.tracked_name = name
+        self.verified_at = time.time()
+
+    def tracking_stats(self):
+        return {
+            "Frames": self.frames,
+            "Verifications": self.verifications,
+            "VerificationRate": round(self.verifications / self.frames, 3) if self.frames else None,
+            "TrackedFrames": self.tracked_frames,
+            "Reverify": dict(self.reverify),
+            "MeanDrift": round(self.drift_total / self.drift_count, 3) if self.drift_count else None,
+            "LastDrift": round(self.last_drift, 3) if self.last_drift is not None else None,
+        }
 
     def run_recognition(self):
         global Globalflag
         print(f'Face Detection Flag is {Globalflag}')
         text = ""
+        frames = frame_ring.subscribe('FaceVerification')
+        self.reset_tracking()
 
         while Globalflag:
-            frame = get_camera_frame()
+            detector_schedule.wait('FaceVerification')
+            seq, frame = frames.next()
             if frame is None:
                 print("No image captured for face detection")
                 continue
                 
             text = "Verified Student disappeared"
             print("Running Face Verification Function")
-            # Only process every other frame of video to save time
-            if self.process_current_frame:
-                # Resize frame of video to 1/4 size for faster face recognition processing
-                small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-
-                # Convert the image from BGR color (which OpenCV uses) to RGB color (which face_recognition uses)
-                #rgb_small_frame = small_frame[:, :, ::-1]
-                rgb_small_frame = np.ascontiguousarray(small_frame[:, :, ::-1])
-
-                # Find all the faces and face encodings in the current frame of video
-                self.face_locations = face_recognition.face_locations(rgb_small_frame)
+            self.frames += 1
+            if self.track(frame):
+                # Same verified face, just follow its box
+                x, y, w, h = (int(v) for v in self.tracked_box)
+                self.face_locations = [(y, x + w, y + h, x)]
+                self.face_names = [self.tracked_name]
+            else:
+                # 1/4 size RGB frame from the shared preprocessing stage (face_recognition wants RGB)
+                rgb_small_frame = frame.small_rgb
+
+                # Face boxes from the shared FaceMesh pass (scaled to the small frame) replace the
+                # dlib HOG detector, the encoder only crops and encodes them
+                self.face_locations = [(round(y * SMALL_FRAME_SCALE), round((x + w) * SMALL_FRAME_SCALE),
+                                        round((y + h) * SMALL_FRAME_SCALE), round(x * SMALL_FRAME_SCALE))
+                                       for x, y, w, h in get_face_analyzer().analyze(frame).boxes]
                 self.face_encodings = face_recognition.face_encodings(rgb_small_frame, self.face_locations)
 
-                self.face_names = []
-                for face_encoding in self.face_encodings:
-                    # See if the face is a match for the known face(s)
-                    matches = face_recognition.compare_faces(self.known_face_encodings, face_encoding,tolerance=0.85)
-                    name = "Unknown"
-                    confidence = '???'
-
-                    # Calculate the shortest distance to face
-                    face_distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-
-                    best_match_index = np.argmin(face_distances)
-                    if matches[best_match_index]:
-                        tempname = str(self.known_face_names[best_match_index]).split('_')[0]
-                        tempconfidence = face_confidence(face_distances[best_match_index])
-                        if tempname == Student_Name and float(tempconfidence[:-1]) >= 84:
-                            name = tempname
-                            confidence = tempconfidence
-
-                    self.face_names.append(f'{name} ({confidence})')
-
-            self.process_current_frame = not self.process_current_frame
-
-            # Display the results
-            for (top, right, bottom, left), name in zip(self.face_locations, self.face_names):
-                # Scale back up face locations since the frame we detected in was scaled to 1/4 size
-                top *= 4
-                right *= 4
-                bottom *= 4
-                left *= 4
-                if "Unknown" not in name:
-                    # Create the frame with the name
-                    text = "Verified Student appeared"
-                cv2.rectangle(frame, (left, top), (right, bottom), (0, 0, 255), 2)
-                cv2.rectangle(frame, (left, bottom - 35), (right, bottom), (0, 0, 255), cv2.FILLED)
-                cv2.putText(frame, name, (left + 6, bottom - 6), cv2.FONT_HERSHEY_DUPLEX, 0.8, (255, 255, 255), 1)
+                # Compared with the logged-in student's profiles only
+                self.face_names = self.verify_faces(self.face_encodings)
+                self.verifications += 1
+                self.start_tracking(frame)
+
+            # The clip is cut from the session recording, so nothing is drawn on the frame
+            if any("Unknown" not in name for name in self.face_names):
+                text = "Verified Student appeared"
 
             # Display the resulting image
            # cv2.imshow('Face Recognition', frame)
             print(text)
-            faceDetectionRecording(frame, text)
+            face_episode.update(text)
+            detector_schedule.ran('FaceVerification', frame)
             # Hit 'q' on the keyboard to quit!
+        face_episode.close()
 
 #Second: Head Movement Detection Function
-def headMovmentDetection(image, face_mesh):
-    print("Running HeadMovement Function")
-    # Flip the image horizontally for a later selfie-view display
-    # Also convert the color space from BGR to RGB
-    image = cv2.cvtColor(cv2.flip(image, 1), cv2.COLOR_BGR2RGB)
-
-    # To improve performance
-    image.flags.writeable = False
-
-    # Get the result
-    results = face_mesh.process(image)
-
-    # To improve performance
-    image.flags.writeable = True
-
-    # Convert the color space from RGB to BGR
-    image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-
-    img_h, img_w, img_c = image.shape
-    face_3d = []
-    face_2d = []
-
-    if results.multi_face_landmarks:
-        for face_landmarks in results.multi_face_landmarks:
-            for idx, lm in enumerate(face_landmarks.landmark):
-                if idx == 33 or idx == 263 or idx == 1 or idx == 61 or idx == 291 or idx == 199:
-                    if idx == 1:
-                        nose_2d = (lm.x * img_w, lm.y * img_h)
-                        nose_3d = (lm.x * img_w, lm.y * img_h, lm.z * 8000)
-
-                    x, y = int(lm.x * img_w), int(lm.y * img_h)
-
-                    # Get the 2D Coordinates
-                    face_2d.append([x, y])
-
-                    # Get the 3D Coordinates
-                    face_3d.append([x, y, lm.z])
-
-                    # Convert it to the NumPy array
-            face_2d = np.array(face_2d, dtype=np.float64)
-
-            # Convert it to the NumPy array
-            face_3d = np.array(face_3d, dtype=np.float64)
-
-            # The camera matrix
+HEAD_POSE_LANDMARKS = (1, 33, 61, 199, 263, 291)  # Nose tip, eye corners, mouth corners and chin (FaceMesh indexes)
+
+class HeadPoseEstimator:
+    """Head rotation from six FaceMesh landmarks.
+
+    The six points are copied straight into preallocated arrays, the camera matrix is
+    built once per frame size, and with `tracking` the previous pose seeds solvePnP so it
+    converges in a few iterations (tracking=False solves every frame from scratch, as
+    before). estimate_batch() re-scores a sequence of recorded frames offline.
+    """
+
+    def __init__(self, tracking=True):
+        self.tracking = tracking
+        self.face_2d = np.empty((len(HEAD_POSE_LANDMARKS), 2), dtype=np.float64)
+        self.face_3d = np.empty((len(HEAD_POSE_LANDMARKS), 3), dtype=np.float64)
+        self.dist_matrix = np.zeros((4, 1), dtype=np.float64)
+        self.cameras = {}  # (width, height) -> camera matrix
+        self.rot_vec = None
+        self.trans_vec = None
+
+    def camera_matrix(self, img_w, img_h):
+        cam_matrix = self.cameras.get((img_w, img_h))
+        if cam_matrix is None:
             focal_length = 1 * img_w
-
+            # Same intrinsics as before (including the swapped centre), the angle thresholds are tuned to them
             cam_matrix = np.array([[focal_length, 0, img_h / 2],
                                    [0, focal_length, img_w / 2],
-                                   [0, 0, 1]])
-
-            # The Distance Matrix
-            dist_matrix = np.zeros((4, 1), dtype=np.float64)
-
-            # Solve PnP
-            success, rot_vec, trans_vec = cv2.solvePnP(face_3d, face_2d, cam_matrix, dist_matrix)
-
-            # Get rotational matrix
-            rmat, jac = cv2.Rodrigues(rot_vec)
-
-            # Get angles
-            angles, mtxR, mtxQ, Qx, Qy, Qz = cv2.RQDecomp3x3(rmat)
-
-            # Get the y rotation degree
-            x = angles[0] * 360
-            y = angles[1] * 360
-            # print(y)
-            textHead = ''
-            # See where the user's head tilting (relaxed thresholds for natural movement)
-            if y < -15:  # Relaxed from -5 to allow more natural left movement
-                textHead = "Looking Left"
-            elif y > 15:  # Relaxed from 5 to allow more natural right movement
-                textHead = "Looking Right"
-            elif x < -15:  # Relaxed from -8 to allow more natural down movement
-                textHead = "Looking Down"
-            elif x > 20:  # Relaxed from 10 to allow more natural up movement
-                textHead = "Looking Up"
+                                   [0, 0, 1]], dtype=np.float64)
+            self.cameras[(img_w, img_h)] = cam_matrix
+        return cam_matrix
+
+    def reset(self):
+        """Forget the previous pose (new exam, or the face was lost)"""
+        self.rot_vec = None
+        self.trans_vec = None
+
+    def estimate(self, face_landmarks, img_w, img_h, mirror=True):
+        """(x, y) rotation of one face, mirror=True for landmarks of the unflipped frame"""
+        landmark = face_landmarks.landmark
+        for row, idx in enumerate(HEAD_POSE_LANDMARKS):
+            lm = landmark[idx]
+            x, y = int(((1 - lm.x) if mirror else lm.x) * img_w), int(lm.y * img_h)
+            self.face_2d[row, 0] = x
+            self.face_2d[row, 1] = y
+            self.face_3d[row, 0] = x
+            self.face_3d[row, 1] = y
+            self.face_3d[row, 2] = lm.z
+
+        cam_matrix = self.camera_matrix(img_w, img_h)
+        if self.rot_vec is None or not self.tracking:
+            success, rot_vec, trans_vec = cv2.solvePnP(self.face_3d, self.face_2d, cam_matrix, self.dist_matrix)
+        else:
+            success, rot_vec, trans_vec = cv2.solvePnP(self.face_3d, self.face_2d, cam_matrix, self.dist_matrix,
+                                                       self.rot_vec.copy(), self.trans_vec.copy(),
+                                                       useExtrinsicGuess=True)
+        if not success:
+            self.reset()
+            return None
+        self.rot_vec, self.trans_vec = rot_vec, trans_vec
+
+        # Get rotational matrix and angles
+        rmat, jac = cv2.Rodrigues(rot_vec)
+        angles, mtxR, mtxQ, Qx, Qy, Qz = cv2.RQDecomp3x3(rmat)
+        return angles[0] * 360, angles[1] * 360
+
+    def estimate_batch(self, faces, img_w, img_h, mirror=True):
+        """Poses of consecutive recorded frames (None where a frame has no face), for offline re-scoring"""
+        self.reset()
+        poses = []
+        for face_landmarks in faces:
+            if face_landmarks is None:
+                self.reset()
+                poses.append(None)
             else:
-                textHead = "Forward"
-            # Add the text on the image
-            cv2.putText(image, textHead, (20, 20), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-            Head_record_duration(textHead, image)
+                poses.append(self.estimate(face_landmarks, img_w, img_h, mirror))
+        self.reset()
+        return poses
+
+def head_direction(x, y):
+    """Where the student is looking, from the head rotation"""
+    # See where the user's head tilting (relaxed thresholds for natural movement)
+    if y < -15:  # Relaxed from -5 to allow more natural left movement
+        return "Looking Left"
+    elif y > 15:  # Relaxed from 5 to allow more natural right movement
+        return "Looking Right"
+    elif x < -15:  # Relaxed from -8 to allow more natural down movement
+        return "Looking Down"
+    elif x > 20:  # Relaxed from 10 to allow more natural up movement
+        return "Looking Up"
+    return "Forward"
+
+head_pose = HeadPoseEstimator()
+
+def headMovmentDetection(frame, faces):
+    print("Running HeadMovement Function")
+    img_h, img_w, img_c = frame.image.shape
+    if not faces.count:
+        head_pose.reset()
+        return
+
+    # Landmarks of the student's face from the shared analysis (of the unflipped frame)
+    pose = head_pose.estimate(faces.landmarks[faces.primary], img_w, img_h, mirror=True)
+    if pose is None:
+        return
+    textHead = head_direction(*pose)
+    head_episode.update(textHead)
 
 
 #Third : More than one person Detection Function
-def MTOP_Detection(img):
+def MTOP_Detection(frame):
+    global student_face_boxes
     print("Running MTOP Function")
-    imgRGB = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    results = faceDetection.process(imgRGB)
+    faces = get_face_analyzer().analyze(frame)
     textMTOP = ''
-    if results.detections:
-        for id, detection in enumerate(results.detections):
-            bboxC = detection.location_data.relative_bounding_box
-            ih, iw, ic = img.shape
-            bbox = int(bboxC.xmin * iw), int(bboxC.ymin * ih), \
-                int(bboxC.width * iw), int(bboxC.height * ih)
-            # Drawing the recantangle
-            cv2.rectangle(img, bbox, (255, 0, 255), 2)
-            # cv2.putText(img, f'{int(detection.score[0] * 100)}%', (bbox[0], bbox[1] - 20), cv2.FONT_HERSHEY_PLAIN, 3, (255, 255, 255), 10)
-        if id > 0:
+    if faces.count:
+        # Region of interest for the electronic device detection
+        student_face_boxes = (time.time(), faces.boxes)
+        if faces.count > 1:
             textMTOP = "More than one person is detected."
         else:
             textMTOP = "Only one person is detected"
     else:
         textMTOP="Only one person is detected"
-    MTOP_record_duration(textMTOP, img)
+    mtop_episode.update(textMTOP)
     print(textMTOP)
 
 #Fourth : Screen Detection Function ( Key-words and Screens)
@@ -980,6 +2147,7 @@ def screenDetection():
     # Get current active window
     new_active_window = gw.getActiveWindow()
     frame = capture_screen()
+    session_recorder.record('screen', frame)
 
     if new_active_window is not None:
         current_title = new_active_window.title
@@ -1016,29 +2184,119 @@ def screenDetection():
 
     print(f"[DEBUG] Final decision: '{textScreen}'")
     print("=" * 50)
-    SD_record_duration(textScreen, frame)
+    screen_episode.update(textScreen)
     print(textScreen)
 
 #Fifth : Electronic Devices Detection Function
+class YoloBatchServer:
+    """Runs the YOLO model on batches of frames instead of one frame per call.
+
+    Frames submitted by any exam session (or any other caller) are collected for up to
+    `deadline` seconds or until `max_batch` frames are waiting, then predicted together
+    so the Python/PyTorch dispatch overhead is paid once per batch. Every caller gets a
+    Future that resolves to the ultralytics Result for its own frame.
+    """
+
+    def __init__(self, model, max_batch=YOLO_BATCH_SIZE, deadline=YOLO_BATCH_DEADLINE, conf=None, imgsz=None,
+                 classes=None, per_frame=False):
+        self.model = model
+        self.per_frame = per_frame  # Exported graphs have a fixed batch of one, their frames are predicted one by one
+        self.max_batch = max_batch
+        self.deadline = deadline
+        self.conf = ED_CONFIDENCE if conf is None else conf
+        self.imgsz = ED_IMGSZ if imgsz is None else imgsz  # Must match the input size the graph was exported at
+        self.classes = classes
+        self.requests = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.frames = 0
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.serve, name='YoloBatchServer', daemon=True)
+                self.thread.start()
+
+    def submit(self, frame):
+        """Queue one frame for detection, returns a Future with its Result"""
+        future = Future()
+        self.start()
+        self.requests.put((frame, future))
+        return future
+
+    def predict(self, frames):
+        """Detect on several frames at once and wait for all of their Results"""
+        futures = [self.submit(frame) for frame in frames]
+        return [future.result() for future in futures]
+
+    def serve(self):
+        while True:
+            batch = [self.requests.get()]
+            batch_deadline = time.time() + self.deadline
+            while len(batch) < self.max_batch:
+                remaining = batch_deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.run_batch(batch)
+
+    def run_batch(self, batch):
+        batch = [(frame, future) for frame, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            sources = [[frame] for frame, _ in batch] if self.per_frame else [[frame for frame, _ in batch]]
+            results = [result for source in sources
+                       for result in self.model.predict(source=source, conf=self.conf, imgsz=self.imgsz,
+                                                        classes=self.classes, save=False, verbose=False)]
+        except Exception as e:
+            print(f"Error in YOLO batch inference: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.frames += len(batch)
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+def device_detection_input(frame):
+    """Image to run YOLO on and the factor mapping its pixels back to the camera frame"""
+    seen_at, boxes = student_face_boxes
+    if not ED_USE_ROI or not boxes or time.time() - seen_at > ED_ROI_MAX_AGE:
+        return frame.yolo_input, frame.yolo_scale
+    # Region around the student: a face width to each side, from a face height above down to the desk
+    img_h, img_w = frame.image.shape[:2]
+    left = max(min(x - w for x, y, w, h in boxes), 0)
+    right = min(max(x + 2 * w for x, y, w, h in boxes), img_w)
+    top = max(min(y - h for x, y, w, h in boxes), 0)
+    bottom = min(max(y + 4 * h for x, y, w, h in boxes), img_h)
+    if right <= left or bottom <= top:
+        return frame.yolo_input, frame.yolo_scale
+    roi = frame.image[top:bottom, left:right]
+    scale = YOLO_INPUT_SIZE / max(roi.shape[:2])
+    if scale >= 1:
+        return np.ascontiguousarray(roi), 1.0
+    roi = cv2.resize(roi, (round(roi.shape[1] * scale), round(roi.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+    return roi, 1 / scale
+
 def electronicDevicesDetection(frame):
-    global model, EDFlag
-    # Predict on image
-    detect_params = model.predict(source=[frame], conf=0.25, save=False)  # Reduced sensitivity: 0.45 -> 0.25
-    # Convert tensor array to numpy
-    DP = detect_params[0].numpy()
+    global EDFlag
+    # Predict on the pre-shrunk frame or student ROI (YOLO then only pads it), batched with any other waiting frames
+    image, scale = device_detection_input(frame)
+    detect_params = [get_yolo_server().submit(image).result()]
     for result in detect_params:  # iterate results
-        boxes = result.boxes.cpu().numpy()  # get boxes on cpu in numpy
-        for box in boxes:  # iterate boxes
-            r = box.xyxy[0].astype(int)  # get corner points as int
-            detected_obj = result.names[int(box.cls[0])]
-            if (detected_obj == 'cell phone' or detected_obj == 'remote' or detected_obj == 'laptop' or detected_obj == 'laptop,book'): EDFlag = True
+        if devices_detected(result, scale): EDFlag = True
     textED = ''
     # Display the resulting frame
     if EDFlag:
         textED = 'Electronic Device Detected'
     else:
         textED = "No Electronic Device Detected"
-    EDD_record_duration(textED, frame)
+    device_episode.update(textED)
     print(textED)
     # Note: EDFlag is NOT reset here anymore - it will be managed by the caller
 
@@ -1046,15 +2304,11 @@ def electronicDevicesDetection(frame):
 class Recorder:
     @staticmethod
     def rms(frame):
-        count = len(frame) / SHORT_WIDTH
-        format = "%dh" % (count)
-        shorts = struct.unpack(format, frame)
-
-        sum_squares = 0.0
-        for sample in shorts:
-            n = sample * SHORT_NORMALIZE
-            sum_squares += n * n
-        rms = math.pow(sum_squares / count, 0.5)
+        # View the 16-bit samples in place and sum the squares in one vectorized call
+        shorts = np.frombuffer(frame, dtype=np.int16).astype(np.float64)
+        if shorts.size == 0:
+            return 0.0
+        rms = math.sqrt(np.dot(shorts, shorts) / shorts.size) * SHORT_NORMALIZE
 
         return rms * 1000
 
@@ -1071,6 +2325,9 @@ class Recorder:
             self.quiet = []
             self.quiet_idx = -1
             self.timeout = 0
+            self.wf = None  # Voice violation being streamed to disk
+            self.rid = None  # Result id of the exam the voice violation started in
+            self.trailing = []  # Quiet chunks held back until we know whether the sound goes on
             self.microphone_available = True
             print("Microphone initialized successfully")
         except Exception as e:
@@ -1088,22 +2345,21 @@ class Recorder:
             print("Microphone not available, skipping audio recording")
             return
             
-        sound = []
         start = time.time()
         begin_time = None
         while Globalflag:
             try:
                 data = self.stream.read(CHUNK)
-                rms_val = self.rms(data)
-                if self.inSound(data):
-                    sound.append(data)
+                rms_val = self.rms(data)  # Computed once per chunk and shared with inSound
+                if self.inSound(rms_val):
                     if begin_time == None:
                         begin_time = datetime.datetime.now()
+                        self.open_violation()
+                    self.write_chunk(data, rms_val)
                 else:
-                    if len(sound) > 0:
+                    if begin_time is not None:
                         duration=math.floor((datetime.datetime.now()-begin_time).total_seconds())
-                        self.write(sound, begin_time, duration)
-                        sound.clear()
+                        self.close_violation(begin_time, duration)
                         begin_time = None
                     else:
                         self.queueQuiet(data)
@@ -1116,6 +2372,10 @@ class Recorder:
             except Exception as e:
                 print(f"Error in audio recording: {e}")
                 break
+        # Keep a violation that was still going on when the exam ended
+        if begin_time is not None:
+            duration = math.floor((datetime.datetime.now() - begin_time).total_seconds())
+            self.close_violation(begin_time, duration)
 
     # quiet is a circular buffer of size cushion
     def queueQuiet(self, data):
@@ -1138,7 +2398,7 @@ class Recorder:
         ret = []
 
         if len(self.quiet) < CUSHION_FRAMES:
-            ret.append(self.quiet)
+            ret.extend(self.quiet)
             ret.extend(sound)
         else:
             ret.extend(self.quiet[self.quiet_idx + 1:])
@@ -1147,8 +2407,7 @@ class Recorder:
 
         return ret
 
-    def inSound(self, data):
-        rms = self.rms(data)
+    def inSound(self, rms):
         curr = time.time()
 
         if rms > TRIGGER_RMS:
@@ -1161,32 +2420,52 @@ class Recorder:
         self.timeout = 0
         return False
 
-    def write(self, sound, begin_time, duration):
-        # insert the pre-sound quiet frames into sound
-        sound = self.dequeueQuiet(sound)
+    def open_violation(self):
+        """Open the violation WAV at sound onset and write the pre-roll from queueQuiet first"""
+        self.filename = str(random.randint(1,50000))+"VoiceViolation"
+        self.rid = get_resultId()  # The exam may have ended by the time the sound stops
+        self.pathname = os.path.join(f_name_directory, '{}.wav'.format(self.filename))
+        self.wf = wave.open(self.pathname, 'wb')
+        self.wf.setnchannels(CHANNELS)
+        self.wf.setsampwidth(self.p.get_sample_size(FORMAT))
+        self.wf.setframerate(RATE)
+        for data in self.dequeueQuiet([]):
+            self.wf.writeframesraw(data)
+        # The pre-roll belongs to this recording, start collecting a fresh one for the next
+        self.quiet = []
+        self.quiet_idx = -1
+        self.trailing = []
+
+    def write_chunk(self, data, rms):
+        """Stream one chunk of the ongoing sound to disk"""
+        if rms > TRIGGER_RMS:
+            # Still talking, the quiet chunks in between are part of the recording
+            for quiet in self.trailing:
+                self.wf.writeframesraw(quiet)
+            self.trailing = []
+            self.wf.writeframesraw(data)
+        else:
+            # Quiet chunk inside the timeout, at most TIMEOUT_FRAMES are held in memory
+            self.trailing.append(data)
 
+    def close_violation(self, begin_time, duration):
         # sound ends with TIMEOUT_FRAMES of quiet
-        # remove all but CUSHION_FRAMES
-        keep_frames = len(sound) - TIMEOUT_FRAMES + CUSHION_FRAMES
-        recording = b''.join(sound[0:keep_frames])
-        filename = str(random.randint(1,50000))+"VoiceViolation"
-        pathname = os.path.join(f_name_directory, '{}.wav'.format(filename))
-        wf = wave.open(pathname, 'wb')
-        wf.setnchannels(CHANNELS)
-        wf.setsampwidth(self.p.get_sample_size(FORMAT))
-        wf.setframerate(RATE)
-        wf.writeframes(recording)
-        wf.close()
+        # keep only CUSHION_FRAMES of it
+        for quiet in self.trailing[:CUSHION_FRAMES]:
+            self.wf.writeframesraw(quiet)
+        self.trailing = []
+        self.wf.close()  # Patches the WAV header with the final length
+        self.wf = None
         voiceViolation = {
             "Name": "Common Noise is detected.",
             "Time": begin_time.strftime("%Y-%m-%d %H:%M:%S"),
             "Duration": str(duration) + " seconds",
             "Mark": duration,
-            "Link": '{}.wav'.format(filename),
-            "RId": get_resultId()
+            "Link": '{}.wav'.format(self.filename),
+            "RId": self.rid
         }
         write_json(voiceViolation)
-        print('[+] Saved: {}'.format(pathname))
+        print('[+] Saved: {}'.format(self.pathname))
 
     def test_microphone(self):
         """Test microphone sensitivity and display real-time audio levels"""
@@ -1210,15 +2489,19 @@ class Recorder:
 def cheat_Detection1():
     deleteTrashVideos()
     global Globalflag
-    mp_face_mesh = mp.solutions.face_mesh
-    face_mesh = mp_face_mesh.FaceMesh(min_detection_confidence=0.5, min_tracking_confidence=0.5)
+    analyzer = get_face_analyzer()
+    head_pose.reset()
     print(f'CD1 Flag is {Globalflag}')
+    frames = frame_ring.subscribe('HeadMovement')
     while Globalflag:
-        image = get_camera_frame()
+        detector_schedule.wait('HeadMovement')
+        seq, image = frames.next()
         if image is not None:
-            headMovmentDetection(image, face_mesh)
+            headMovmentDetection(image, analyzer.analyze(image))
+            detector_schedule.ran('HeadMovement', image)
         else:
             print("No image captured for head movement detection")
+    head_episode.close()
     deleteTrashVideos()
 
 def screen_detection_thread():
@@ -1226,75 +2509,184 @@ def screen_detection_thread():
     print(f'Screen Detection Thread Flag is {Globalflag}')
     deleteTrashVideos()
     while Globalflag:
+        detector_schedule.wait('Screen')
         # Screen detection doesn't need camera frames, it captures screen directly
         screenDetection()
-        time.sleep(0.1)  # Small delay for screen detection
+        detector_schedule.ran('Screen')
+    screen_episode.close()
     deleteTrashVideos()
 
 def mtop_detection_thread():
     global Globalflag
     print(f'MTOP Detection Thread Flag is {Globalflag}')
     deleteTrashVideos()
+    frames = frame_ring.subscribe('MTOP')
     while Globalflag:
-        image = get_camera_frame()
+        detector_schedule.wait('MTOP')
+        seq, image = frames.next()
         if image is not None:
             MTOP_Detection(image)
+            detector_schedule.ran('MTOP', image)
         else:
             print("No image captured for MTOP detection")
+    mtop_episode.close()
     deleteTrashVideos()
 
 def electronic_device_detection_thread():
     global Globalflag, EDFlag
     print(f'Electronic Device Detection Thread Flag is {Globalflag}')
     deleteTrashVideos()
+    frames = frame_ring.subscribe('ElectronicDevice')
     while Globalflag:
-        image = get_camera_frame()
+        detector_schedule.wait('ElectronicDevice')
+        seq, image = frames.next()
         if image is not None:
             EDFlag = False
             print("Electronic device detection is active")
             electronicDevicesDetection(image)
+            detector_schedule.ran('ElectronicDevice', image)
         else:
             print("No image captured for electronic device detection")
+    device_episode.close()
     deleteTrashVideos()
 
+def session_recording_thread():
+    global Globalflag
+    print(f'Session Recording Thread Flag is {Globalflag}')
+    session_recorder.start()
+    frames = frame_ring.subscribe('Recording')
+    while Globalflag:
+        seq, image = frames.next()
+        if image is not None:
+            session_recorder.record('camera', image.image, image.time)
+    session_recorder.stop()
+
+#Model Loading Related
+def load_libraries():
+    """Import face_recognition, MediaPipe and Ultralytics on first use"""
+    global face_recognition, mp, YOLO
+    with models_lock:
+        if face_recognition is None:
+            import face_recognition
+        if mp is None:
+            import mediapipe as mp
+        if YOLO is None:
+            from ultralytics import YOLO
+
+def load_pyav():
+    """Import PyAV on first use, False if it is not installed"""
+    global av
+    with models_lock:
+        if av is None:
+            try:
+                import av
+            except ImportError:
+                print("PyAV not found. Recording with OpenCV (mp4v) instead of H.264.")
+                print("Install it with 'pip install av' for smaller, browser-playable clips.")
+                av = False
+        return av
+
+def get_device_model():
+    """Electronic device model, loaded on first use"""
+    global device_model, DEVICE_CLASS_IDS
+    with models_lock:
+        if device_model is None:
+            device_model = load_device_model()
+            DEVICE_CLASS_IDS = device_class_ids(device_model)
+        return device_model
+
+def get_yolo_server():
+    """Batch server for the electronic device model, created on first use"""
+    global yolo_server
+    with models_lock:
+        if yolo_server is None:
+            yolo_server = YoloBatchServer(get_device_model(), classes=DEVICE_CLASS_IDS, per_frame=ED_BACKEND != 'pytorch')
+        return yolo_server
+
+def get_face_analyzer():
+    """Shared FaceMesh analysis for the face checks, created on first use"""
+    global face_analyzer
+    with models_lock:
+        if face_analyzer is None:
+            load_libraries()
+            face_analyzer = FaceAnalyzer()
+        return face_analyzer
+
+def get_recorder():
+    """Voice recorder (opens the microphone on first use)"""
+    global recorder
+    with models_lock:
+        if recorder is None:
+            recorder = Recorder()
+        return recorder
+
+def get_face_recognition():
+    """Face verification (encodes the profile images on first use)"""
+    global face_recognizer
+    with models_lock:
+        if face_recognizer is None:
+            face_recognizer = FaceRecognition()
+        return face_recognizer
+
+def warm_up():
+    """Load every model and device the exam needs, so the detector threads start without a delay"""
+    global models_warm
+    with models_lock:
+        if models_warm:
+            return
+        start = time.time()
+        # One dummy prediction so the first real frame does not pay for the graph setup
+        get_yolo_server().submit(np.zeros((ED_IMGSZ, ED_IMGSZ, 3), dtype=np.uint8)).result()
+        get_face_analyzer()
+        get_recorder()
+        get_face_recognition()
+        models_warm = True
+        print(f"Models warmed up in {time.time() - start:.2f}s")
+
+def __getattr__(name):
+    # utils.a, utils.fr and utils.model are created the first time they are used
+    if name == 'a':
+        return get_recorder()
+    if name == 'fr':
+        return get_face_recognition()
+    if name == 'model':
+        return get_device_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 #Query Related
-#Function to give the next resut id
-def get_resultId():
+#Function to read the last allocated result id (never lower than the highest id in the result log)
+def last_resultId():
     try:
-        with open('result.json', 'r') as file:
-            try:
-                file_data = json.load(file)
-                if not file_data:
-                    return 1
-                valid_data = [entry for entry in file_data if isinstance(entry.get("Id"), int)]
-                if not valid_data:
-                    return 1
-                valid_data.sort(key=lambda x: x["Id"])
-                return valid_data[-1]["Id"] + 1
-            except json.JSONDecodeError:
-                # File is empty or malformed
-                return 1
-    except FileNotFoundError:
-        # File does not exist
-        return 1
+        with open(RESULT_ID_COUNTER, 'r') as counter:
+            last = int(counter.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        last = 0
+    return max(last, json_index('result.json').max_id)
+
+#Function to reserve a new result id for an exam
+def allocate_resultId():
+    with result_id_lock:
+        result_id = last_resultId() + 1
+        # Write the new value to a temp file and swap it in, so the counter is never half-written
+        temp_path = RESULT_ID_COUNTER + '.tmp'
+        with open(temp_path, 'w') as counter:
+            counter.write(str(result_id))
+            counter.flush()
+            os.fsync(counter.fileno())
+        os.replace(temp_path, RESULT_ID_COUNTER)
+        return result_id
+
+#Function to give the result id of the exam in progress (or the one the next exam will get)
+def get_resultId():
+    if current_result_id is not None:
+        return current_result_id
+    with result_id_lock:
+        return last_resultId() + 1
 
 #Function to give the trust score
 def get_TrustScore(Rid):
     try:
-        with open('violation.json', 'r') as file:
-            # First we load existing data into a dict.
-            file_data = json.load(file)
-            filtered_data = [item for item in file_data if item.get("RId") == Rid]
-            total_mark = sum(item.get("Mark", 0) for item in filtered_data)
-            return total_mark
-    except FileNotFoundError:
-        # File does not exist
-        print("violation.json not found.")
-        return 0
-    except json.JSONDecodeError:
-        # File is empty or not valid JSON
-        print("violation.json is empty or corrupt.")
-        return 0
+        return json_index('violation.json').marks.get(Rid, 0)
     except Exception as e:
         # Handle missing keys or other errors
         print(f"Error in get_TrustScore: {e}")
@@ -1303,46 +2695,72 @@ def get_TrustScore(Rid):
 #Function to give all results
 def getResults():
     try:
-        with open('result.json', 'r+') as file:
-            # First we load existing data into a dict.
-            result_data = json.load(file)
-            return result_data
-    except FileNotFoundError:
-        # File does not exist, return empty list or dict as appropriate
-        return []
-    except json.JSONDecodeError:
-        # File is empty or not valid JSON, return empty list or dict as appropriate
-        return []
+        return list(json_index('result.json').rows)
     except Exception as e:
         # Log or handle other exceptions as needed
         print(f"Error reading results: {e}")
         return []
 
+#Function to give one page of results, newest first by default (keyset pagination on the result id and row)
+def queryResults(after=None, limit=50, search='', status='', date_from='', date_to='',
+                 min_trust=None, max_trust=None, descending=True, max_scan=RESULT_SCAN_LIMIT):
+    # The cursor "rid:row" is the last row looked at, so a result id whose rows span two pages is not skipped
+    try:
+        after_rid, after_row = (int(part) for part in after.split(':')) if after else (None, -1)
+    except ValueError:
+        after_rid, after_row = None, -1
+    index = json_index('result.json')
+    with index.lock:
+        ids = index.ids
+        # Start at the cursor instead of skipping `offset` rows
+        if descending:
+            end = bisect.bisect_right(ids, after_rid) if after_rid is not None else len(ids)
+            candidates = (ids[i] for i in range(end - 1, -1, -1))
+        else:
+            start = bisect.bisect_left(ids, after_rid) if after_rid is not None else 0
+            candidates = (ids[i] for i in range(start, len(ids)))
+        search = search.lower()
+        page = []
+        last = None
+        scanned = 0
+        finished = True
+        for rid in candidates:
+            rows = index.by_key[rid]
+            for row in range(after_row + 1 if rid == after_rid else 0, len(rows)):
+                # A full page, or the scan limit of a selective filter: continue from here next time
+                if len(page) >= limit or scanned >= max_scan:
+                    finished = False
+                    break
+                scanned += 1
+                last = (rid, row)
+                result = rows[row]
+                if search and search not in str(result.get("Name", "")).lower():
+                    continue
+                if status and not str(result.get("Status", "")).startswith(status):
+                    continue
+                if date_from and str(result.get("Date", "")) < date_from:
+                    continue
+                if date_to and str(result.get("Date", "")) > date_to:
+                    continue
+                trust = result.get("TrustScore", 0)
+                if min_trust is not None and trust < min_trust:
+                    continue
+                if max_trust is not None and trust > max_trust:
+                    continue
+                page.append(result)
+            if not finished:
+                break
+    next_cursor = None if finished or last is None else f"{last[0]}:{last[1]}"
+    return page, next_cursor
+
 #Function to give result details
 def getResultDetails(rid):
     try:
         rid = int(rid)
-        with open('result.json', 'r') as res_file:
-            result_data = json.load(res_file)
-            filtered_result = [item for item in result_data if item.get("Id") == rid]
-
-        with open('violation.json', 'r') as vio_file:
-            violation_data = json.load(vio_file)
-            filtered_violations = [item for item in violation_data if item.get("RId") == rid]
-
         return {
-            "Result": filtered_result,
-            "Violation": filtered_violations
+            "Result": list(json_index('result.json').by_key.get(rid, [])),
+            "Violation": list(json_index('violation.json').by_key.get(rid, []))
         }
-    except FileNotFoundError as e:
-        print(f"File missing: {e.filename}")
-        return {}
-    except json.JSONDecodeError:
-        print("Invalid JSON format in result or violation file.")
-        return {}
     except Exception as e:
         print(f"Unexpected error: {e}")
         return {}
-
-a = Recorder()
-fr = FaceRecognition()